@@ -0,0 +1,53 @@
+"""Пользовательские фрагменты в общих для всех страницах.
+
+Страница ленты одинакова для всех посетителей, кроме шапки и кнопок
+подписки. Тег {% fragment %} в таких местах оставляет метку вместо
+разметки, если view закэширована как общая для всех
+(request.defer_fragments), и fill() подставляет фрагменты текущего
+пользователя уже при отдаче страницы. Так одна копия страницы в кэше
+обслуживает и гостей, и авторизованных пользователей.
+
+Параметры фрагмента - значения JSON (строки, числа, True, False,
+None) и хранятся в метке как JSON, так что False остается ложью, а
+не строкой 'False'.
+"""
+import json
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Текст постов экранируется, так что '<!--' в нем метку не подделает
+PLACEHOLDER = re.compile(
+    r'<!--fragment:(?P<template>[\w/.-]+)\?(?P<params>[^>]*)-->'
+)
+
+
+def render(request, template, params):
+    return render_to_string(template, params, request=request)
+
+
+def encode(params):
+    """Параметры в JSON; значение другого типа - TypeError"""
+    return quote(json.dumps(params, sort_keys=True), safe='')
+
+
+def decode(data):
+    return json.loads(unquote(data))
+
+
+def placeholder(template, params):
+    return mark_safe(f'<!--fragment:{template}?{encode(params)}-->')
+
+
+def fill(request, content):
+    """Подставляем фрагменты текущего пользователя вместо меток"""
+    return PLACEHOLDER.sub(
+        lambda match: render(
+            request,
+            match.group('template'),
+            decode(match.group('params')),
+        ),
+        content,
+    )
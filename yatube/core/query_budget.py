@@ -0,0 +1,44 @@
+"""Бюджет SQL-запросов для view.
+
+@query_budget(n) объявляет, сколько запросов view может сделать,
+когда ответ не взят из кэша (включая запросы сессии и пользователя
+при первом обращении к request.user). При QUERY_BUDGET_STRICT = True
+превышение бюджета роняет запрос с перечнем всех запросов, поэтому
+лишний N+1 ловится в тестах и при разработке, а не в продакшене.
+"""
+from functools import wraps
+
+from django.db import connection
+from django.conf import settings
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(budget):
+    """Объявляет бюджет запросов view"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.QUERY_BUDGET_STRICT:
+                return view(request, *args, **kwargs)
+            with CaptureQueriesContext(connection) as context:
+                response = view(request, *args, **kwargs)
+            if len(context) > budget:
+                raise QueryBudgetExceeded('\n'.join([
+                    f'{view.__module__}.{view.__name__}: '
+                    f'{len(context)} SQL-запросов при бюджете {budget}',
+                    *(query['sql'] for query in context.captured_queries),
+                ]))
+            return response
+        wrapper.query_budget = budget
+        return wrapper
+    return decorator
+
+
+def get_within_budget(client, path, *args, **kwargs):
+    """GET-запрос тестовым клиентом с проверкой бюджета запросов"""
+    with override_settings(QUERY_BUDGET_STRICT=True):
+        return client.get(path, *args, **kwargs)
@@ -0,0 +1,375 @@
+"""Общий для процессов кэш в файле SQLite.
+
+LocMemCache держит копию кэша в каждом процессе и вытесняет записи
+по их числу. SharedCache хранит записи в одном файле (LOCATION),
+который видят все процессы на хосте, и вытесняет давно не читанные
+записи, когда их суммарный размер превышает MAX_BYTES. Крупные
+значения (отрисованные страницы) сжимаются zlib. Попадания, промахи,
+вытеснения и занятые байты считаются в том же файле - их показывает
+команда cache_stats.
+
+Чтение - обычный SELECT без блокировки файла на запись. Отметки о
+чтении для LRU и попадания с промахами копятся в памяти процесса и
+пишутся пачкой: вместе с ближайшей записью в кэш или в конце запроса,
+если прошло FLUSH_INTERVAL секунд, а файл не занят. Поэтому LRU и
+статистика приблизительны: недавнее чтение другого процесса может
+быть еще не видно.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.shared_cache.SharedCache',
+            'LOCATION': '/var/tmp/yatube/cache.sqlite3',
+            'OPTIONS': {
+                'MAX_BYTES': 64 * 1024 * 1024,
+                'COMPRESS_MIN_BYTES': 1024,
+                'FLUSH_INTERVAL': 1,
+            },
+        },
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'compressed INTEGER NOT NULL, size INTEGER NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), "
+    "('misses', 0), ('evictions', 0), ('bytes', 0)",
+)
+
+# Сколько записей вытеснять за один запрос к файлу
+EVICT_BATCH = 100
+
+# Сколько секунд запись ждет, пока файл занят другим процессом
+BUSY_TIMEOUT = 10
+
+# После стольких прочитанных ключей отметки пишутся, не дожидаясь
+# конца запроса
+FLUSH_KEYS = 1000
+
+
+class SharedCache(BaseCache):
+    """Кэш в файле SQLite с вытеснением LRU по объему и сжатием"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self.compress_min_bytes = int(
+            options.get('COMPRESS_MIN_BYTES', 1024)
+        )
+        self.compress_level = int(options.get('COMPRESS_LEVEL', 6))
+        self.flush_interval = float(options.get('FLUSH_INTERVAL', 1))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение свое у каждого потока и у каждого процесса:
+        # после fork унаследованным соединением пользоваться нельзя
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.location, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+            # Накопленное чтениями, но еще не записанное в файл
+            self._local.accessed = {}
+            self._local.hits = self._local.misses = 0
+            self._local.flushed = time.monotonic()
+        return self._local.db
+
+    @contextmanager
+    def _write(self):
+        """Транзакция, сразу занимающая файл на запись; заодно пишет
+        накопленное чтениями"""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            self._flush(db)
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _flush(self, db):
+        """Пишем отметки о чтении и статистику в открытой транзакции"""
+        local = self._local
+        if local.accessed:
+            db.executemany(
+                'UPDATE cache SET accessed = MAX(accessed, ?) '
+                'WHERE key = ?',
+                [(now, key) for key, now in local.accessed.items()],
+            )
+        self._add_stats(db, hits=local.hits, misses=local.misses)
+        local.accessed = {}
+        local.hits = local.misses = 0
+        local.flushed = time.monotonic()
+
+    def _flush_soon(self):
+        """Пишем накопленное, если пора; занятый файл не ждем -
+        отметки подождут следующей попытки"""
+        db = self._db
+        local = self._local
+        if not (local.accessed or local.hits or local.misses):
+            return
+        if len(local.accessed) < FLUSH_KEYS and (
+            time.monotonic() - local.flushed < self.flush_interval
+        ):
+            return
+        db.execute('PRAGMA busy_timeout = 0')
+        try:
+            db.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            local.flushed = time.monotonic()
+            return
+        finally:
+            db.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+        try:
+            self._flush(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self.compress_min_bytes:
+            packed = zlib.compress(data, self.compress_level)
+            if len(packed) < len(data):
+                return packed, True
+        return data, False
+
+    @staticmethod
+    def _decode(data, compressed):
+        if compressed:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _add_stats(self, db, **deltas):
+        for name, delta in deltas.items():
+            if delta:
+                db.execute(
+                    'UPDATE stats SET value = value + ? WHERE name = ?',
+                    (delta, name),
+                )
+
+    def _remove(self, db, keys):
+        """Удаляем ключи; возвращаем, сколько байт освободилось"""
+        freed = 0
+        for key in keys:
+            row = db.execute(
+                'SELECT size FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row:
+                db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                freed += row[0]
+        return freed
+
+    def _store(self, db, key, value, expires, now):
+        data, compressed = self._encode(value)
+        freed = self._remove(db, [key])
+        db.execute(
+            'INSERT INTO cache (key, value, compressed, size, expires, '
+            'accessed) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, data, compressed, len(data), expires, now),
+        )
+        return len(data) - freed
+
+    def _evict(self, db, now):
+        """Освобождаем место: сначала просроченные, потом давно не читанные"""
+        freed = db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache WHERE expires <= ?',
+            (now,),
+        ).fetchone()[0]
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        total = self._bytes(db) - freed
+        evicted = 0
+        while total > self.max_bytes:
+            rows = db.execute(
+                'SELECT key, size FROM cache ORDER BY accessed LIMIT ?',
+                (EVICT_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                total -= size
+                freed += size
+                evicted += 1
+        self._add_stats(db, bytes=-freed, evictions=evicted)
+
+    @staticmethod
+    def _bytes(db):
+        return db.execute(
+            "SELECT value FROM stats WHERE name = 'bytes'"
+        ).fetchone()[0]
+
+    def _set_many(self, items, timeout, only_new=False):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        stored = []
+        with self._write() as db:
+            grown = 0
+            for key, value in items:
+                if only_new and self._alive(db, key, now):
+                    continue
+                grown += self._store(db, key, value, expires, now)
+                stored.append(key)
+            self._add_stats(db, bytes=grown)
+            if self._bytes(db) > self.max_bytes:
+                self._evict(db, now)
+        return stored
+
+    @staticmethod
+    def _alive(db, key, now):
+        return db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, now),
+        ).fetchone() is not None
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._set_many([(key, value)], timeout, only_new=True))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_many([(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        self._set_many(items, timeout)
+        return []
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return {}
+        db = self._db
+        now = time.time()
+        rows = db.execute(
+            'SELECT key, value, compressed FROM cache '
+            'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ),
+            (*keys, now),
+        ).fetchall()
+        found = {
+            keys[key]: self._decode(value, compressed)
+            for key, value, compressed in rows
+        }
+        local = self._local
+        local.accessed.update((key, now) for key, _, _ in rows)
+        local.hits += len(found)
+        local.misses += len(keys) - len(found)
+        if len(local.accessed) >= FLUSH_KEYS:
+            self._flush_soon()
+        return found
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as db:
+            changed = db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now),
+            ).rowcount
+        return bool(changed)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        with self._write() as db:
+            self._add_stats(db, bytes=-self._remove(db, keys))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._alive(self._db, key, time.time())
+
+    def incr(self, key, delta=1, version=None):
+        # Чтение и запись под одной блокировкой файла: счетчики
+        # поколений лент увеличивают сразу несколько процессов
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value, compressed, expires FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(row[0], row[1]) + delta
+            grown = self._store(db, key, value, row[2], now)
+            self._add_stats(db, bytes=grown)
+        return value
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+            db.execute("UPDATE stats SET value = 0 WHERE name = 'bytes'")
+
+    def stats(self):
+        """Попадания, промахи, вытеснения, байты и число записей"""
+        # Вместе с накопленным чтениями этого процесса
+        with self._write() as db:
+            stats = dict(db.execute('SELECT name, value FROM stats'))
+            stats['entries'] = db.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+        return stats
+
+    def reset_stats(self):
+        with self._write() as db:
+            db.execute(
+                "UPDATE stats SET value = 0 WHERE name != 'bytes'"
+            )
+
+    def close(self, **kwargs):
+        # Соединение живет весь процесс: Django закрывает кэши
+        # после каждого запроса, а открывать файл заново дорого.
+        # Конец запроса - время записать накопленное чтениями
+        self._flush_soon()
@@ -0,0 +1,21 @@
+from django import template
+
+from core.fragments import decode, encode, placeholder, render
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def fragment(context, template_name, **params):
+    """Фрагмент, зависящий от пользователя: {% fragment 'шаблон' %}.
+
+    Шаблон отрисовывается отдельно, ему доступны только request,
+    контекстные процессоры и параметры тега - значения JSON.
+    """
+    request = context.get('request')
+    # Через JSON и без метки: сразу отрисованный фрагмент получает
+    # параметры тех же типов, что и отложенный
+    params = decode(encode(params))
+    if getattr(request, 'defer_fragments', False):
+        return placeholder(template_name, params)
+    return render(request, template_name, params)
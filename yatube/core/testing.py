@@ -0,0 +1,46 @@
+"""Настройки тестового окружения.
+
+Тесты не трогают кэш разработчика: на каждый запуск заводится свой
+файл общего кэша. Миниатюры и смена режимов лент выполняются прямо
+в тестовом процессе: рабочие процессы пулов заново читают
+yatube.settings и писали бы в общий кэш разработчика.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def isolated_settings():
+    """Переопределяет настройки на время тестового запуска"""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    default = dict(
+        settings.CACHES['default'],
+        LOCATION=os.path.join(directory, 'shared.sqlite3'),
+    )
+    try:
+        with override_settings(
+            CACHES=dict(settings.CACHES, default=default),
+            THUMBNAIL_WORKERS=0,
+            TIMELINE_WORKERS=0,
+        ):
+            yield
+    finally:
+        shutil.rmtree(directory, True)
+
+
+class TestRunner(DiscoverRunner):
+    """manage.py test в изолированном окружении"""
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolated = isolated_settings()
+        self.isolated.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
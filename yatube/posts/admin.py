@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group, Follow
+from .search import filter_matching
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу, а не LIKE '%...%' по text
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
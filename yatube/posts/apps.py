@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Подключаем обработчики сигналов
+        from . import signals  # noqa: F401
+        from .search import restore_triggers
+
+        # SQLite теряет триггеры поиска, когда миграции пересоздают
+        # posts_post
+        post_migrate.connect(restore_triggers, sender=self)
@@ -0,0 +1,259 @@
+"""Кэширование лент.
+
+Страницы лент версионированы: у каждой ленты (главная, группа,
+профиль) есть счетчик поколений в кэше. Страница сохраняется вместе
+с поколениями, для которых она была отрисована; сигналы моделей
+увеличивают счетчик, и все страницы ленты сразу становятся
+устаревшими, хотя живут в кэше часами. Проверка попадания - один
+get_many: поколения и страница разом.
+
+Устаревшую страницу перестраивает только один запрос (замок в
+кэше на CACHE_FEED_LOCK секунд); остальные тем временем получают
+старую копию, которая хранится на CACHE_FEED_GRACE дольше срока.
+Незадолго до срока страница перестраивается заранее с растущей
+вероятностью, чтобы истечение не совпало у многих запросов.
+
+Страница хранится одна на всех пользователей: шапка и кнопки
+подписки в ней - метки core.fragments, которые заполняются для
+текущего пользователя при каждой отдаче.
+
+Карточки постов (includes/one_post.html) кэшируются отдельно под
+ключом из id и версии поста, так что при промахе страницы заново
+отрисовываются только изменившиеся карточки.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core.fragments import fill
+
+from .thumbnails import ready_thumbnail_sizes
+
+# Общее поколение: его увеличение сбрасывает все ленты разом
+ALL_FEEDS = 'all'
+
+
+def generation_key(feed):
+    return f'feed-generation:{feed}'
+
+
+def page_key(request, feed):
+    # Страница общая для всех пользователей: их фрагменты
+    # подставляются при отдаче
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'feed-page:{feed}:{path}'
+
+
+def bump(*feeds):
+    """Помечаем ленты измененными"""
+    for feed in feeds:
+        try:
+            cache.incr(generation_key(feed))
+        except ValueError:
+            # Счетчика нет - значит, и страниц этой ленты нет
+            pass
+
+
+def feed_name(feed, kwargs):
+    """Имя ленты: шаблон с аргументами view или функция от них"""
+    return feed(**kwargs) if callable(feed) else feed.format(**kwargs)
+
+
+def generations(keys, cached):
+    """Поколения лент; отсутствующие счетчики заводим заново"""
+    missing = [key for key in keys if key not in cached]
+    if missing:
+        # Начинаем со времени, чтобы не совпасть со старым счетчиком
+        start = time.time_ns()
+        for key in missing:
+            cache.add(key, start, None)
+        cached.update(cache.get_many(missing))
+    return tuple(cached.get(key) for key in keys)
+
+
+def cache_feed(feed):
+    """Кэширует страницу ленты до изменения ее данных.
+
+    feed - шаблон имени ленты, подставляются аргументы view:
+    @cache_feed('group:{slug}'), или функция, которая получает их
+    именованными и возвращает имя.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            request.defer_fragments = True
+            name = feed_name(feed, kwargs)
+            keys = [generation_key(ALL_FEEDS), generation_key(name)]
+            key = page_key(request, name)
+            cached = cache.get_many([*keys, key])
+            entry = cached.pop(key, None)
+            current = generations(keys, cached)
+            if entry is not None and entry[0] == current and not expiring(
+                entry
+            ):
+                return with_fragments(request, entry[1])
+            # Перестраивает страницу один запрос, остальные на это время
+            # получают устаревшую копию, если она есть
+            lock = f'{key}:lock'
+            locked = cache.add(lock, True, settings.CACHE_FEED_LOCK)
+            if not locked and entry is not None:
+                # ETag устаревшей копии - по ее поколениям, иначе @condition
+                # подпишет ее текущими и клиент получит 304 со старой страницей
+                response = with_fragments(request, entry[1])
+                response['ETag'] = page_etag(request, entry[0])
+                return response
+            try:
+                start = time.monotonic()
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(
+                        key,
+                        (
+                            current,
+                            response,
+                            time.time() + settings.CACHE_FEED_PAGE,
+                            time.monotonic() - start,
+                        ),
+                        settings.CACHE_FEED_PAGE + settings.CACHE_FEED_GRACE,
+                    )
+            finally:
+                if locked:
+                    cache.delete(lock)
+            return with_fragments(request, response)
+        return wrapper
+    return decorator
+
+
+def feed_etag(feed, timeout=None):
+    """Функция ETag для @condition: страница не менялась, пока не
+    менялись поколения ленты.
+
+    Считается одним get_many без отрисовки. В ETag входят куки
+    сессии и CSRF: шапка и форма страницы зависят от пользователя.
+    timeout ограничивает жизнь ETag, если на странице есть данные,
+    которые меняются без смены поколения (счетчики автора).
+    """
+    def etag(request, *args, **kwargs):
+        name = feed_name(feed, kwargs)
+        keys = [generation_key(ALL_FEEDS), generation_key(name)]
+        current = generations(keys, cache.get_many(keys))
+        return page_etag(request, current, timeout)
+    return etag
+
+
+def page_etag(request, current, timeout=None):
+    """ETag страницы, построенной при поколениях current"""
+    parts = [
+        request.get_full_path(),
+        *map(str, current),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    if timeout:
+        parts.append(str(int(time.time() // timeout)))
+    return 'W/"{}"'.format(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def cache_data(feed, key, build, timeout):
+    """Данные, собранные build(), кэшируются до изменения ленты feed"""
+    keys = [generation_key(ALL_FEEDS), generation_key(feed)]
+    cached = cache.get_many([*keys, key])
+    entry = cached.pop(key, None)
+    current = generations(keys, cached)
+    if entry is not None and entry[0] == current:
+        return entry[1]
+    data = build()
+    cache.set(key, (current, data), timeout)
+    return data
+
+
+def with_fragments(request, response):
+    """Общая страница с шапкой и кнопками текущего пользователя"""
+    content = response.content.decode(response.charset)
+    response.content = fill(request, content)
+    return response
+
+
+def expiring(entry):
+    """Пора ли перестроить страницу заранее, до истечения срока.
+
+    Вероятностный пересчет: чем ближе срок и чем дольше страница
+    строилась, тем вероятнее, что ее перестроит очередной запрос,
+    так что к сроку приходит не толпа запросов, а один.
+    """
+    expires, delta = entry[2], entry[3]
+    beta = settings.CACHE_FEED_EARLY_BETA
+    return time.time() - delta * beta * math.log(1 - random.random()) >= (
+        expires
+    )
+
+
+CARD_TEMPLATE = 'includes/one_post.html'
+CARD_STATS = ('post-card-stats:hits', 'post-card-stats:misses')
+
+
+def card_key(post):
+    """Ключ карточки меняется вместе с постом и именем автора"""
+    author = post.author
+    author_version = hashlib.md5(
+        f'{author.username}|{author.get_full_name()}'.encode()
+    ).hexdigest()
+    return (
+        f'post-card:{post.pk}:{post.updated.timestamp()}:{author_version}'
+    )
+
+
+def get_cards(posts):
+    """Отрисованные карточки постов страницы: {id поста: html}.
+
+    Закэшированные берутся одним get_many, остальные отрисовываются
+    и кладутся в кэш одним set_many.
+    """
+    keys = {post.pk: card_key(post) for post in posts}
+    cached = cache.get_many(keys.values())
+    # Миниатюры для отрисовки недостающих карточек ищем разом
+    images = [post.image for post in posts if keys[post.pk] not in cached]
+    post_thumbnails = ready_thumbnail_sizes(
+        images, settings.POST_THUMBNAILS
+    ) if any(images) else {}
+    cards, missed = {}, {}
+    for post in posts:
+        key = keys[post.pk]
+        if key in cached:
+            cards[post.pk] = cached[key]
+        else:
+            cards[post.pk] = missed[key] = render_to_string(
+                CARD_TEMPLATE,
+                {'post': post, 'post_thumbnails': post_thumbnails},
+            )
+    if missed:
+        cache.set_many(missed, settings.CACHE_POST_CARD)
+    count_cards(len(cards) - len(missed), len(missed))
+    return cards
+
+
+def count_cards(hits, misses):
+    for key, delta in zip(CARD_STATS, (hits, misses)):
+        if not delta:
+            continue
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+
+def card_stats():
+    """Счетчики попаданий и промахов кэша карточек"""
+    values = cache.get_many(CARD_STATS)
+    return {
+        'hits': values.get(CARD_STATS[0], 0),
+        'misses': values.get(CARD_STATS[1], 0),
+    }
@@ -0,0 +1,149 @@
+"""Денормализованные счетчики.
+
+Число постов автора и группы, комментариев поста, подписчиков и
+подписок хранится в колонках и меняется сигналами через F(), так что
+страницы не делают COUNT(*). reconcile() пачками сверяет колонки с
+настоящими значениями и чинит расхождения; расхождение, замеченное
+пагинатором, чинит schedule_recount().
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Group, Post, UserCounters
+from .object_cache import groups
+
+User = get_user_model()
+
+POSTS_TOTAL_KEY = 'posts-total'
+
+# (модель со счетчиком, поле счетчика, что считаем, ключ в нем)
+COUNTERS = (
+    (UserCounters, 'posts_count', Post, 'author_id'),
+    (UserCounters, 'followers_count', Follow, 'author_id'),
+    (UserCounters, 'following_count', Follow, 'user_id'),
+    (Group, 'posts_count', Post, 'group_id'),
+    (Post, 'comments_count', Comment, 'post_id'),
+)
+
+
+def change(model, pk, **deltas):
+    """Атомарно сдвигаем счетчики строки; вернет число обновленных строк"""
+    if pk is None:
+        return 0
+    return model.objects.filter(pk=pk).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def change_user(user_id, **deltas):
+    updated = change(UserCounters, user_id, **deltas)
+    # Строки счетчиков нет - заводим ее с настоящими значениями.
+    # При уменьшении не заводим: пользователь может удаляться каскадом
+    if not updated and min(deltas.values()) > 0:
+        create_user_counters([user_id])
+        recount(UserCounters, [user_id])
+
+
+def total_posts():
+    """Всего постов на сайте: из кэша, COUNT(*) только при промахе"""
+    total = cache.get(POSTS_TOTAL_KEY)
+    if total is None:
+        total = Post.objects.count()
+        cache.set(POSTS_TOTAL_KEY, total, settings.CACHE_POSTS_TOTAL)
+    return total
+
+
+def change_total_posts(delta):
+    try:
+        cache.incr(POSTS_TOTAL_KEY, delta)
+    except ValueError:
+        # Значения в кэше нет - посчитается при следующем чтении
+        pass
+
+
+def forget_total_posts():
+    """Число постов в кэше разошлось с базой - посчитаем заново"""
+    cache.delete(POSTS_TOTAL_KEY)
+
+
+def schedule_recount(model, pk):
+    """Сверяем счетчики строки после фиксации транзакции, не чаще
+    раза в COUNTERS_RECOUNT_THROTTLE секунд"""
+    key = f'counters-recount:{model._meta.label_lower}:{pk}'
+    if cache.add(key, True, settings.COUNTERS_RECOUNT_THROTTLE):
+        transaction.on_commit(lambda: recount(model, [pk]))
+
+
+def actual_counts(source, key, pks):
+    return dict(
+        source.objects.filter(**{f'{key}__in': pks})
+        .values_list(key).annotate(Count('pk')).order_by()
+    )
+
+
+def recount(model, pks):
+    """Сверяем счетчики строк pks; вернет число исправленных значений"""
+    fixed = set()
+    count = 0
+    for counted, field, source, key in COUNTERS:
+        if counted is not model:
+            continue
+        actual = actual_counts(source, key, pks)
+        stored = model.objects.filter(pk__in=pks).values_list('pk', field)
+        for pk, value in stored:
+            if value != actual.get(pk, 0):
+                model.objects.filter(pk=pk).update(
+                    **{field: actual.get(pk, 0)}
+                )
+                fixed.add(pk)
+                count += 1
+    if model is Group and fixed:
+        # Закэшированные группы хранят posts_count
+        groups.invalidate(*Group.objects.filter(
+            pk__in=fixed
+        ).values_list('slug', flat=True))
+    return count
+
+
+def create_user_counters(user_ids):
+    existing = set(
+        UserCounters.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', flat=True)
+    )
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(user_id=user_id)
+            for user_id in user_ids if user_id not in existing
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def batches(queryset, batch_size):
+    """Первичные ключи queryset пачками по возрастанию"""
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def reconcile(batch_size=1000):
+    """Чиним все счетчики пачками; вернет {модель: исправлено}"""
+    for pks in batches(User.objects.all(), batch_size):
+        create_user_counters(pks)
+    fixed = {}
+    for model in (UserCounters, Group, Post):
+        fixed[model._meta.verbose_name_plural] = sum(
+            recount(model, pks)
+            for pks in batches(model.objects.all(), batch_size)
+        )
+    return fixed
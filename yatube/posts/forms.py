@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from . import images
 from .models import Post, Comment
 
 
@@ -9,6 +12,20 @@ class PostForm(forms.ModelForm):
         # укажем, какие поля должны быть видны в форме и в каком порядке
         fields = ('text', 'group', 'image',)
 
+    def clean_image(self):
+        """Новую картинку нормализуем и перекодируем в JPEG и WebP"""
+        image = self.cleaned_data['image']
+        self.image_webp = None
+        if isinstance(image, UploadedFile):
+            image, self.image_webp = images.normalize(image)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            # WebP-копия меняется и удаляется вместе с картинкой
+            self.instance.image_webp = self.image_webp
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
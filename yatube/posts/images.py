@@ -0,0 +1,210 @@
+"""Сведения о картинках постов: размеры, байты и хэш содержимого.
+
+Сведения записываются при сохранении поста с новой картинкой: ширина
+и высота - по заголовку, размер и SHA-256 - по кускам загруженного
+файла. Шаблоны берут все это из колонок поста и файл не открывают.
+Картинкам, загруженным раньше, сведения дописывает команда
+backfill_image_metadata; картинка, которую не удалось прочитать,
+остается без сведений.
+
+Загрузки из PostForm перед сохранением нормализуются: размеры
+проверяются по заголовку, картинка поворачивается по ориентации из
+EXIF, уменьшается до POST_IMAGE_MAX_SIDE и перекодируется в JPEG и
+WebP без метаданных. Исходник читается из временного файла загрузки,
+результат пишется во временные файлы, а не в память.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.files.images import get_image_dimensions
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching, thumbnails
+from .counters import batches
+from .models import Post
+from .storage import image_storage
+
+FIELDS = ['image_width', 'image_height', 'image_bytes', 'image_hash']
+
+# Поля поста с файлами в хранилище картинок
+FILE_FIELDS = ['image', 'image_webp']
+
+
+def digest(file):
+    """Размер в байтах и SHA-256 файла, прочитанного кусками"""
+    sha256 = hashlib.sha256()
+    size = 0
+    for chunk in file.chunks():
+        sha256.update(chunk)
+        size += len(chunk)
+    return size, sha256.hexdigest()
+
+
+def dimensions(file):
+    """Ширина и высота по заголовку картинки; (None, None), если ее
+    не удалось прочитать"""
+    try:
+        return get_image_dimensions(file)
+    except (OSError, ValueError):
+        return None, None
+
+
+def describe(post):
+    """Записываем в пост размеры, объем и хэш новой картинки"""
+    if not post.image:
+        post.image_width = post.image_height = post.image_bytes = None
+        post.image_hash = ''
+    elif not post.image._committed:
+        # Картинку только что загрузили и она еще не в хранилище
+        post.image_width, post.image_height = dimensions(post.image)
+        post.image_bytes, post.image_hash = digest(post.image)
+
+
+def committed(post, field):
+    """Имя файла поля в хранилище или None.
+
+    Значение читается из __dict__: отложенное поле не стоит
+    запроса к базе. Еще не сохраненные загрузки не считаются.
+    """
+    value = post.__dict__.get(field)
+    if isinstance(value, FieldFile):
+        value = value.name if value._committed else None
+    return value if isinstance(value, str) and value else None
+
+
+def field_files(post):
+    """Файлы в хранилище, на которые ссылается пост, по полям"""
+    names = {field: committed(post, field) for field in FILE_FIELDS}
+    return {field: name for field, name in names.items() if name}
+
+
+def files(post):
+    """Файлы в хранилище, на которые ссылается пост"""
+    return set(field_files(post).values())
+
+
+def uploads(post):
+    """Поля, в которые загружен еще не сохраненный файл"""
+    return {
+        field for field in FILE_FIELDS
+        if post.__dict__.get(field) and committed(post, field) is None
+    }
+
+
+def release(names):
+    """Снимаем ссылки на файлы после фиксации транзакции; с последней
+    ссылкой удаляются файл и его миниатюры"""
+    def release_files():
+        for name in names:
+            if image_storage.release(name):
+                thumbnails.forget(name)
+
+    if names:
+        transaction.on_commit(release_files)
+
+
+def backfill(batch_size=1000):
+    """Дописываем сведения картинкам, загруженным до их появления.
+
+    Вернет (дописано, не найдено файлов). Пост, чей файл не удалось
+    открыть, остается без сведений.
+    """
+    storage = Post._meta.get_field('image').storage
+    queryset = Post.objects.exclude(image='').filter(
+        Q(image_hash='') | Q(image_width__isnull=True)
+    )
+    described = missing = 0
+    for pks in batches(queryset, batch_size):
+        posts = []
+        rows = Post.objects.filter(pk__in=pks).values_list('pk', 'image')
+        for pk, name in rows:
+            try:
+                with storage.open(name) as file:
+                    width, height = dimensions(file)
+                    size, sha256 = digest(file)
+            except (OSError, SuspiciousFileOperation):
+                missing += 1
+                continue
+            posts.append(Post(
+                pk=pk,
+                image_width=width,
+                image_height=height,
+                image_bytes=size,
+                image_hash=sha256,
+                # Карточки постов кэшируются по времени изменения
+                updated=timezone.now(),
+            ))
+        Post.objects.bulk_update(posts, [*FIELDS, 'updated'])
+        described += len(posts)
+    if described:
+        # bulk_update обходит сигналы - сбрасываем страницы сами
+        caching.bump(caching.ALL_FEEDS)
+    return described, missing
+
+
+def open_upload(upload):
+    """Картинка из загрузки; у больших загрузок - прямо из временного
+    файла"""
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(upload)
+
+
+def encode(image, format, **params):
+    """Кодируем картинку во временный файл"""
+    file = tempfile.TemporaryFile()
+    image.save(file, format, **params)
+    file.seek(0)
+    return file
+
+
+def normalize(upload):
+    """Нормализуем загруженную картинку; вернет (JPEG, WebP) - файлы
+    с тем же именем и расширениями .jpg и .webp"""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    # Image.open читает только заголовок: размеры известны до
+    # декодирования картинки
+    with open_upload(upload) as image:
+        if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая: не больше %(pixels)s пикселей',
+                code='too_many_pixels',
+                params={'pixels': settings.POST_IMAGE_MAX_PIXELS},
+            )
+        # JPEG сразу декодируется в уменьшенном масштабе
+        image.draft('RGB', (max_side, max_side))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        # Прозрачность в JPEG заменяем белым фоном
+        flat = Image.new('RGB', image.size, 'white')
+        flat.paste(image, mask=image.getchannel('A'))
+    else:
+        image = flat = image.convert('RGB')
+    # EXIF не передаем - в файлы он не попадет
+    jpeg = encode(
+        flat, 'JPEG',
+        quality=settings.POST_IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+        icc_profile=icc_profile,
+    )
+    webp = encode(
+        image, 'WEBP',
+        quality=settings.POST_IMAGE_WEBP_QUALITY,
+        method=6,
+        icc_profile=icc_profile,
+    )
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(jpeg, f'{name}.jpg'), File(webp, f'{name}.webp')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Дописывает размеры, объем и хэш картинкам постов, '
+        'загруженным до появления этих колонок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов обновлять за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        described, missing = images.backfill(options['batch_size'])
+        self.stdout.write(f'Дописано картинок: {described}')
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f'Файлов не найдено: {missing}')
+            )
@@ -0,0 +1,182 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время запросов лент с индексами '
+        'и без них. С --fill сначала наполняет базу тестовыми данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fill',
+            action='store_true',
+            help='Создать тестовых авторов, группы, посты и комментарии',
+        )
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз выполнять каждый запрос',
+        )
+
+    def handle(self, *args, **options):
+        if options['fill']:
+            self.fill(options)
+        # Самый комментируемый пост: его автор, группа и комментарии
+        top = Comment.objects.values_list('post_id').annotate(
+            comments=Count('pk')
+        ).order_by('-comments').first()
+        post = Post.objects.filter(pk=top[0]).first() if top else (
+            Post.objects.first()
+        )
+        if post is None:
+            self.stderr.write('Постов нет: запустите с --fill')
+            return
+        queries = {
+            'index': Post.objects.order_by('-pub_date')[:10],
+            'profile': Post.objects.filter(
+                author_id=post.author_id
+            ).order_by('-pub_date')[:10],
+            'group_list': Post.objects.filter(
+                group_id=post.group_id
+            ).order_by('-pub_date')[:10],
+            'comments': Comment.objects.filter(
+                post_id=post.pk
+            ).order_by('-pub_date')[:10],
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексами'))
+        after = self.measure(queries, options['repeat'], 'with_indexes')
+        with transaction.atomic():
+            self.drop_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING('Без индексов'))
+            before = self.measure(
+                queries, options['repeat'], 'without_indexes'
+            )
+            # Индексы возвращаются откатом транзакции
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.MIGRATE_HEADING('Итого, мс'))
+        for name in queries:
+            self.stdout.write(
+                f'{name:12} без индексов {before[name]:9.3f}   '
+                f'с индексами {after[name]:9.3f}'
+            )
+
+    def explain(self, queryset, phase):
+        # Текст запроса зависит от фазы: sqlite3 кэширует подготовленный
+        # EXPLAIN и не перестраивает план после DROP INDEX
+        sql, params = queryset.query.sql_with_params()
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql} -- {phase}', params)
+            return '; '.join(
+                ' '.join(map(str, row)) for row in cursor.fetchall()
+            )
+
+    def measure(self, queries, repeat, phase):
+        timings = {}
+        for name, queryset in queries.items():
+            self.stdout.write(f'{name}: {self.explain(queryset, phase)}')
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            timings[name] = (time.perf_counter() - start) / repeat * 1000
+        return timings
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+    def fill(self, options):
+        """Пишем напрямую в таблицы: сигналы лент здесь не нужны"""
+        User.objects.bulk_create(
+            User(username=f'{BENCH_PREFIX}{index}')
+            for index in range(options['authors'])
+        )
+        Group.objects.bulk_create(
+            Group(
+                title=f'Группа {index}',
+                slug=f'{BENCH_PREFIX}{index}',
+                description='Группа для замеров',
+            )
+            for index in range(options['groups'])
+        )
+        author_ids = list(User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=BENCH_PREFIX
+        ).values_list('pk', flat=True))
+        now = timezone.now()
+        adapt = connection.ops.adapt_datetimefield_value
+        post_table = Post._meta.db_table
+        self.insert(
+            f'INSERT INTO {post_table} (text, pub_date, updated, author_id, '
+            'group_id, image, comments_count) VALUES (%s, %s, %s, %s, %s, '
+            '%s, 0)',
+            (
+                (
+                    f'Пост {index}',
+                    adapt(now - timedelta(seconds=index)),
+                    adapt(now),
+                    random.choice(author_ids),
+                    random.choice(group_ids),
+                    '',
+                )
+                for index in range(options['posts'])
+            ),
+        )
+        # Комментарии сгущаем на немногих постах, как у вирусных постов
+        post_ids = list(
+            Post.objects.order_by('-pub_date').values_list('pk', flat=True)
+            [:100]
+        )
+        self.insert(
+            f'INSERT INTO {Comment._meta.db_table} (text, pub_date, '
+            'author_id, post_id) VALUES (%s, %s, %s, %s)',
+            (
+                (
+                    f'Комментарий {index}',
+                    adapt(now - timedelta(seconds=index)),
+                    random.choice(author_ids),
+                    random.choice(post_ids),
+                )
+                for index in range(options['comments'])
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'База наполнена; счетчики обновит reconcile_counters'
+        ))
+
+    def insert(self, sql, rows, batch_size=10000):
+        batch = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    cursor.executemany(sql, batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
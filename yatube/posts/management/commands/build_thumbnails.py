@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие миниатюры картинкам постов, '
+        'загруженным до их появления'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов проверять за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        built, missing = thumbnails.build_missing(options['batch_size'])
+        self.stdout.write(f'Построены миниатюры картинок: {built}')
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f'Файлов не найдено: {missing}')
+            )
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.caching import card_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша карточек постов'
+
+    def handle(self, *args, **options):
+        stats = card_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'Карточки постов: попаданий {stats["hits"]}, '
+            f'промахов {stats["misses"]}, доля попаданий {ratio:.1%}'
+        )
+        # Общую статистику умеет считать только SharedCache
+        if hasattr(cache, 'stats'):
+            stats = cache.stats()
+            self.stdout.write(
+                f'Кэш целиком: попаданий {stats["hits"]}, '
+                f'промахов {stats["misses"]}, '
+                f'вытеснено {stats["evictions"]}, '
+                f'записей {stats["entries"]}, байт {stats["bytes"]}'
+            )
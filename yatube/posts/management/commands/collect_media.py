@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+from posts.media_gc import Collector
+
+PHASE_TITLES = {
+    'originals': 'Картинки без постов',
+    'entries': 'Лишние записи миниатюр',
+    'thumbnails': 'Файлы миниатюр без записей',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Находит и удаляет картинки, на которые не ссылается ни один '
+        'пост, и устаревшие миниатюры. Прерванный запуск продолжается '
+        'с того же места'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=200,
+            help='Не больше стольких операций с файлами в секунду '
+                 '(0 - без ограничения)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько имен читать из базы за один запрос',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать заново, а не с места прерванного запуска',
+        )
+
+    def handle(self, *args, **options):
+        collector = Collector(
+            dry_run=options['dry_run'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            min_age=options['min_age'],
+            report=self.report if options['verbosity'] > 1 else None,
+        )
+        found = collector.run(restart=options['restart'])
+        for phase, (count, size) in found.items():
+            self.stdout.write(
+                f'{PHASE_TITLES[phase]}: {count}, '
+                f'{size / 1024 / 1024:.1f} МБ'
+            )
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING('Пробный запуск: ничего не удалено')
+            )
+
+    def report(self, phase, name, size):
+        self.stdout.write(f'{phase}: {name}')
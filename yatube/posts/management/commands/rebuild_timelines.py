@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            dest='user_ids',
+            type=int,
+            action='append',
+            help='id пользователя, чью ленту пересобрать (можно несколько)',
+        )
+        parser.add_argument(
+            '--trim',
+            action='store_true',
+            help=(
+                'Не пересобирать ленты, а только обрезать до '
+                'TIMELINE_MAX_LENGTH записей'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['trim']:
+            trimmed = timelines.trim(options['user_ids'])
+            self.stdout.write(f'Лент обрезано: {trimmed}')
+            return
+        timelines.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS('Ленты пересобраны'))
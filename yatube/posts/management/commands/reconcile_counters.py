@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счетчики с базой и чинит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк сверять за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(options['batch_size'])
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}')
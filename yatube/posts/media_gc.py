@@ -0,0 +1,243 @@
+"""Сборка мусора в медиа: картинки без постов и лишние миниатюры.
+
+Картинки остаются на диске, когда пост удаляют вместе с автором без
+сигналов, когда транзакция с новым постом откатывается после записи
+файла и когда файлы загружены до подсчета ссылок (posts/storage.py).
+Сборщик проходит три этапа:
+
+- originals: файлы каталога загрузок и имена из колонок Post.image
+  и Post.image_webp идут двумя потоками, упорядоченными по имени, и
+  сливаются, как при merge join. Файл, которого нет в колонках,
+  удаляется вместе с записью StoredImage и миниатюрами;
+- entries: записи хранилища ключей sorl об исходниках без постов
+  удаляются вместе с миниатюрами, записи о пропавших миниатюрах -
+  сами по себе;
+- thumbnails: файлы миниатюр без записи в хранилище ключей.
+
+Ни каталог, ни колонки целиком в память не читаются: каталоги
+обходятся по одному, колонки - пачками по курсору. Порядок имен в
+базе должен совпадать с порядком строк Python (в SQLite - BINARY).
+Положение обхода сохраняется в кэше после каждой пачки, и прерванный
+запуск продолжается с того же места. Файлы моложе min_age не
+трогаются: они могли быть записаны для поста, который еще не
+сохранен.
+"""
+import heapq
+import os
+import posixpath
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import thumbnails
+from .images import FILE_FIELDS
+from .models import Post, StoredImage
+from .storage import image_storage
+
+PHASES = ['originals', 'entries', 'thumbnails']
+
+
+def checkpoint_key(dry_run):
+    return f'media-gc:{"dry-run" if dry_run else "delete"}'
+
+
+def walk(storage, directory, after=None):
+    """Файлы каталога хранилища по возрастанию имени: (имя, stat).
+
+    Имена идут в том же порядке, что и строки: подкаталог сравнивается
+    как имя со слешем на конце. Поддеревья целиком до after
+    пропускаются без чтения. Скрытые файлы - недописанные загрузки.
+    """
+    try:
+        entries = list(os.scandir(storage.path(directory)))
+    except FileNotFoundError:
+        return
+    keyed = sorted(
+        (posixpath.join(directory, entry.name)
+         + ('/' if entry.is_dir() else ''), entry)
+        for entry in entries
+        if not entry.name.startswith('.')
+    )
+    for name, entry in keyed:
+        if entry.is_dir():
+            if after and name < after and not after.startswith(name):
+                continue
+            yield from walk(storage, name.rstrip('/'), after)
+        elif not after or name > after:
+            yield name, entry.stat()
+
+
+def referenced(field, after=None, batch_size=1000):
+    """Имена файлов из колонки поста по возрастанию, без повторов"""
+    last = after or ''
+    while True:
+        names = list(
+            Post.objects.filter(**{f'{field}__gt': last})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .distinct()[:batch_size]
+        )
+        if not names:
+            return
+        yield from names
+        last = names[-1]
+
+
+def referenced_among(names):
+    """Какие из имен упомянуты в постах"""
+    query = Q()
+    for field in FILE_FIELDS:
+        query |= Q(**{f'{field}__in': names})
+    found = set()
+    for row in Post.objects.filter(query).values_list(*FILE_FIELDS):
+        found.update(row)
+    return found & set(names)
+
+
+class Throttle:
+    """Не больше rate операций с файлами в секунду (0 - без ограничения)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next = time.monotonic()
+
+    def __call__(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next > now:
+            time.sleep(self.next - now)
+        self.next = max(self.next, now) + self.interval
+
+
+class Collector:
+    """Один проход сборщика мусора.
+
+    report(этап, имя, байт) вызывается для каждого найденного мусора;
+    с dry_run ничего не удаляется.
+    """
+
+    def __init__(self, dry_run=False, rate=0, batch_size=1000,
+                 min_age=60 * 60, report=None):
+        self.dry_run = dry_run
+        self.throttle = Throttle(rate)
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.report = report or (lambda phase, name, size: None)
+        self.found = {phase: [0, 0] for phase in PHASES}
+
+    def run(self, restart=False):
+        """Проходим все этапы, продолжая прерванный запуск; вернет
+        {этап: [найдено, байт]}"""
+        key = checkpoint_key(self.dry_run)
+        state = None if restart else cache.get(key)
+        phase, after = state or (PHASES[0], None)
+        for name in PHASES[PHASES.index(phase):]:
+            for cursor in getattr(self, name)(after):
+                cache.set(key, (name, cursor), None)
+            after = None
+        cache.delete(key)
+        return self.found
+
+    def garbage(self, phase, name, size):
+        self.found[phase][0] += 1
+        self.found[phase][1] += size
+        self.report(phase, name, size)
+
+    def old_enough(self, stat):
+        return stat.st_mtime < time.time() - self.min_age
+
+    def originals(self, after):
+        """Картинки, на которые не ссылается ни один пост; отдает
+        курсоры для сохранения"""
+        directory = Post._meta.get_field('image').upload_to.rstrip('/')
+        names = heapq.merge(*(
+            referenced(field, after, self.batch_size)
+            for field in FILE_FIELDS
+        ))
+        name = next(names, None)
+        for count, (path, stat) in enumerate(
+            walk(image_storage, directory, after), 1
+        ):
+            self.throttle()
+            while name is not None and name < path:
+                name = next(names, None)
+            if name != path and self.old_enough(stat) and (
+                # Пост мог появиться, пока шел обход
+                not referenced_among([path])
+            ):
+                self.garbage('originals', path, stat.st_size)
+                if not self.dry_run:
+                    image_storage.delete(path)
+                    StoredImage.objects.filter(name=path).delete()
+                    thumbnails.forget(path)
+            if count % self.batch_size == 0:
+                yield path
+
+    def entries(self, after):
+        """Записи sorl об исходниках без постов и о пропавших
+        миниатюрах"""
+        prefix = add_prefix('')
+        thumbnail_prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        last = after or prefix
+        while True:
+            rows = list(
+                KVStore.objects.filter(
+                    key__startswith=prefix, key__gt=last
+                ).order_by('key').values_list('key', 'value')[:self.batch_size]
+            )
+            if not rows:
+                return
+            files = [deserialize_image_file(value) for _, value in rows]
+            sources = [
+                file.name for file in files
+                if not file.name.startswith(thumbnail_prefix)
+            ]
+            used = referenced_among(sources)
+            for file in files:
+                if file.name.startswith(thumbnail_prefix):
+                    self.throttle()
+                    if file.exists():
+                        continue
+                elif file.name in used:
+                    continue
+                self.garbage('entries', file.name, 0)
+                if not self.dry_run:
+                    default.kvstore.delete(file)
+            last = rows[-1][0]
+            yield last
+
+    def thumbnails(self, after):
+        """Файлы миниатюр, о которых не знает хранилище ключей sorl"""
+        directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        batch = []
+        for path, stat in walk(default.storage, directory, after):
+            self.throttle()
+            batch.append((path, stat))
+            if len(batch) == self.batch_size:
+                yield self._collect_thumbnails(batch)
+                batch = []
+        if batch:
+            yield self._collect_thumbnails(batch)
+
+    def _collect_thumbnails(self, batch):
+        keys = {
+            add_prefix(ImageFile(path, default.storage).key): (path, stat)
+            for path, stat in batch
+        }
+        known = set(
+            KVStore.objects.filter(key__in=keys).values_list('key', flat=True)
+        )
+        for key, (path, stat) in keys.items():
+            if key in known or not self.old_enough(stat):
+                continue
+            self.garbage('thumbnails', path, stat.st_size)
+            if not self.dry_run:
+                default.storage.delete(path)
+        return batch[-1][0]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:10
+
+from django.db import migrations
+
+
+# SQL записан здесь, а не импортирован из posts.search: миграция
+# должна делать то же самое и после правок приложения
+CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+]
+
+CREATE_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert '
+    'AFTER INSERT ON posts_post BEGIN '
+    'INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete '
+    'AFTER DELETE ON posts_post BEGIN '
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_update '
+    'AFTER UPDATE OF text ON posts_post BEGIN '
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); '
+    'END',
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_follow_unique'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_INDEX + CREATE_TRIGGERS,
+            reverse_sql=DROP_INDEX,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='posts/', verbose_name='Картинка WebP'),
+        ),
+    ]
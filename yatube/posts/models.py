@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -8,6 +10,8 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    # Счетчик поддерживается сигналами, см. posts/counters.py
+    posts_count = models.IntegerField('Постов в группе', default=0)
 
     class Meta:
         verbose_name = 'Группа'
@@ -23,6 +27,8 @@ class Post(models.Model):
         help_text='Введите текст поста',
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Версия поста для кэша отрисованных карточек
+    updated = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -39,17 +45,58 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True,
         help_text='3агрузите картинку ',
     )
     # Аргумент upload_to указывает директорию,
     # в которую будут загружаться пользовательские файлы.
+    # Сведения о картинке записываются при загрузке, чтобы шаблонам
+    # не приходилось открывать файл. width_field и height_field
+    # не подходят: с ними Django открывает картинку уже при загрузке
+    # поста из базы, а пропавший файл ломает всю ленту
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_bytes = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, blank=True, editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки', max_length=64, blank=True, editable=False
+    )
+    # Та же картинка в WebP; ее записывает PostForm
+    image_webp = models.ImageField(
+        'Картинка WebP',
+        upload_to='posts/',
+        storage=image_storage,
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.IntegerField('Комментариев', default=0)
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         default_related_name = 'posts'
         ordering = ['-pub_date']
+        # Под ленты: главная, автор и группа сортируются по дате
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            # Сборщик мусора в медиа читает имена файлов по порядку
+            models.Index(fields=['image'], name='post_image_idx'),
+            models.Index(fields=['image_webp'], name='post_image_webp_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text
@@ -80,24 +127,138 @@ class Comment(models.Model):
         verbose_name_plural = 'Комментарии'
         default_related_name = 'comments'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date'],
+                name='comment_post_pub_date_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
 
 
 class Follow(models.Model):
+    # Отдельные индексы по полям не нужны: их покрывают
+    # уникальный (user, author) и индекс (author, user)
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='follower'
+        related_name='follower',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='following'
-
+        related_name='following',
+        db_index=False,
     )
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            # "На кого я подписан" читается по этому же индексу
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+        indexes = [
+            # "Кто подписан на автора"
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    # Копия Post.pub_date: лента читается одним проходом по индексу
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ['-pub_date', '-post_id']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} <- {self.post_id}'
+
+
+class PulledAuthor(models.Model):
+    """Автор с большим числом подписчиков.
+
+    Его посты не раскладываются по лентам при публикации,
+    а подтягиваются в ленту подписчика при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pulled_feed',
+    )
+
+    class Meta:
+        verbose_name = 'Автор с чтением при запросе'
+        verbose_name_plural = 'Авторы с чтением при запросе'
+
+    def __str__(self) -> str:
+        return str(self.author)
+
+
+class UserCounters(models.Model):
+    """Счетчики пользователя, которые дорого считать на лету"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class StoredImage(models.Model):
+    """Файл в хранилище картинок и число ссылающихся на него полей"""
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    size = models.PositiveIntegerField('Размер, байт')
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self) -> str:
+        return self.name
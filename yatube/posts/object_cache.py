@@ -0,0 +1,123 @@
+"""Кэш редко меняющихся объектов: группы по slug, автора по username.
+
+Два уровня: небольшой LRU в памяти процесса перед общим кэшем. В
+процессе объект хранится недолго (OBJECT_CACHE_LOCAL_TTL), потому
+что сигналы сбрасывают его только в том процессе, где объект
+изменился; в общем кэше - до изменения. Отсутствующие slug и
+username тоже запоминаются (на OBJECT_CACHE_MISSING_TIMEOUT), чтобы
+перебор несуществующих профилей не доходил до базы.
+
+В кэше лежат только значения полей fields, а не объект целиком:
+пароль и почта пользователя в кэш не попадают. Каждый get собирает
+из них новый объект, остальные поля у него отложены. Связанные
+объекты, загруженные в одном запросе, не переживают его.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Group, User
+
+# Отметка об отсутствии объекта в общем кэше
+MISSING = False
+
+
+class ObjectCache:
+    """Кэш объектов model по уникальному полю field; хранятся только
+    поля fields"""
+
+    def __init__(self, model, field, fields, local_size=1000):
+        self.model = model
+        self.field = field
+        # from_db ждет значения в порядке полей модели
+        self.fields = [
+            f.attname for f in model._meta.concrete_fields
+            if f.attname in fields
+        ]
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        # Поля входят в ключ: записи со старым набором полей не читаются
+        self._version = hashlib.md5(
+            ','.join(self.fields).encode()
+        ).hexdigest()[:8]
+
+    def key(self, value):
+        value = hashlib.md5(str(value).encode()).hexdigest()
+        return (
+            f'object:{self.model._meta.label_lower}:{self.field}:'
+            f'{self._version}:{value}'
+        )
+
+    def get(self, value):
+        """Объект по значению поля или None"""
+        key = self.key(value)
+        found, data = self._get_local(key)
+        if not found:
+            data = cache.get(key)
+            if data is None:
+                data = self._load(key, value)
+            self._set_local(key, data)
+        if data is MISSING:
+            return None
+        return self.model.from_db(
+            self.model._default_manager.db, self.fields, data
+        )
+
+    def get_or_404(self, value):
+        obj = self.get(value)
+        if obj is None:
+            raise Http404(
+                f'{self.model._meta.object_name} {value!r} не найден'
+            )
+        return obj
+
+    def invalidate(self, *values):
+        keys = [self.key(value) for value in values]
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        cache.delete_many(keys)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _load(self, key, value):
+        data = self.model._default_manager.filter(
+            **{self.field: value}
+        ).values_list(*self.fields).first()
+        if data is None:
+            cache.set(key, MISSING, settings.OBJECT_CACHE_MISSING_TIMEOUT)
+            return MISSING
+        cache.set(key, data, settings.OBJECT_CACHE_TIMEOUT)
+        return data
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self._local.move_to_end(key)
+            return True, entry[1]
+
+    def _set_local(self, key, data):
+        expires = time.monotonic() + settings.OBJECT_CACHE_LOCAL_TTL
+        with self._lock:
+            self._local[key] = (expires, data)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+
+groups = ObjectCache(
+    Group, 'slug', ['id', 'title', 'slug', 'description', 'posts_count']
+)
+users = ObjectCache(
+    User, 'username', ['id', 'username', 'first_name', 'last_name']
+)
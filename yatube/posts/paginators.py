@@ -0,0 +1,209 @@
+from collections.abc import Sequence
+
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(post):
+    """Курсор поста: пара (pub_date, id) в URL-безопасном виде"""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Разбираем курсор; для битого курсора возвращаем None"""
+    try:
+        pub_date, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class KeysetPage(Sequence):
+    """Страница ленты, полученная по курсору"""
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """Пагинатор по курсору (pub_date, id).
+
+    В отличие от Paginator не делает ни OFFSET, ни COUNT(*):
+    любая страница стоит столько же, сколько первая, а новые посты
+    не сдвигают уже открытые страницы.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, after=None, before=None):
+        """Страница после курсора after или перед курсором before"""
+        after = after and decode_cursor(after)
+        before = before and decode_cursor(before)
+        if before and not after:
+            return self._page_before(*before)
+        queryset = self.object_list.order_by('-pub_date', '-pk')
+        if after:
+            pub_date, pk = after
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        posts = list(queryset[:self.per_page + 1])
+        return KeysetPage(
+            posts[:self.per_page],
+            has_next=len(posts) > self.per_page,
+            has_previous=bool(after),
+        )
+
+    def _page_before(self, pub_date, pk):
+        queryset = self.object_list.order_by('pub_date', 'pk').filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        )
+        posts = list(queryset[:self.per_page + 1])
+        if not posts:
+            # Новее курсора ничего нет - показываем первую страницу
+            return self.get_page()
+        return KeysetPage(
+            posts[:self.per_page][::-1],
+            has_next=True,
+            has_previous=len(posts) > self.per_page,
+        )
+
+
+class CountingPaginator(Paginator):
+    """Paginator, которому общее число объектов передают готовым.
+
+    Число берется из денормализованных счетчиков или кэша вместо
+    COUNT(*) и может немного расходиться с базой, поэтому число
+    страниц в шаблоне показывается как приблизительное. Короткая
+    страница - последняя, по ней count уточняется; если расхождение
+    нашлось, вызывается on_drift(), чтобы счетчик пересчитали.
+    """
+
+    ELLIPSIS = '…'
+    # Сколько номеров показывать вокруг текущей страницы и по краям
+    on_each_side = 2
+    on_ends = 1
+
+    def __init__(self, object_list, per_page, count=None, on_drift=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.approximate = count is not None
+        self.on_drift = on_drift
+        if self.approximate:
+            # Перекрываем cached_property Paginator.count
+            self.count = max(count, 0)
+
+    def _correct(self, count):
+        """Счетчик разошелся с базой: берем настоящее число"""
+        if count == self.count:
+            return
+        self.count = count
+        self.__dict__.pop('num_pages', None)
+        if self.on_drift is not None:
+            self.on_drift()
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.approximate or int(number) < 1:
+                raise
+            # Счетчик мог отстать от базы: есть ли такая страница,
+            # проверит page()
+            return int(number)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Страница за концом ленты; count page() уже уточнил
+            return self.page(self.num_pages)
+
+    def page(self, number):
+        if not self.approximate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # Берем на один пост больше и не обрезаем страницу по count:
+        # даже если счетчик отстал от базы, страница будет полной,
+        # а ссылка на следующую - на месте
+        posts = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not posts and number > 1:
+            # Страница за концом ленты: уточняем count по базе, чтобы
+            # get_page отдал настоящую последнюю страницу
+            self._correct(self.object_list.count())
+            raise EmptyPage('Страница не содержит результатов')
+        if len(posts) <= self.per_page:
+            # Последняя страница: теперь число объектов известно точно
+            self._correct(bottom + len(posts))
+        elif bottom + len(posts) > self.count:
+            self._correct(bottom + len(posts))
+        return self._get_page(posts[:self.per_page], number, self)
+
+    def get_elided_page_range(self, number=1):
+        """Номера страниц вокруг number, пропуски заменены на ELLIPSIS.
+
+        Длина окна не зависит от числа страниц, поэтому навигация
+        по группе с тысячами страниц весит столько же, сколько по
+        небольшой. В шаблоне окно отдает тег {% page_window %}.
+        """
+        number = int(number)
+        num_pages = self.num_pages
+        if num_pages <= (self.on_each_side + self.on_ends) * 2:
+            yield from range(1, num_pages + 1)
+            return
+        if number > 1 + self.on_each_side + self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - self.on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - self.on_each_side - self.on_ends - 1:
+            yield from range(number + 1, number + self.on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - self.on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
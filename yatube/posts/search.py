@@ -0,0 +1,181 @@
+"""Полнотекстовый поиск по постам.
+
+Текст постов индексируется в виртуальной таблице SQLite FTS5
+posts_post_fts (external content: сам текст хранится в posts_post).
+Индекс обновляют триггеры базы, поэтому его не обходят ни
+bulk_create, ни update(). SQLite пересоздает таблицу posts_post
+при многих изменениях схемы, и триггеры пропадают вместе со старой
+таблицей, - после каждого migrate их возвращает restore_triggers()
+(сигнал post_migrate) и заодно перестраивает индекс.
+
+Результаты упорядочены по релевантности (bm25) и листаются по
+курсору (rank, id): страница не зависит от числа найденных постов.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Post
+from .paginators import KeysetPage
+
+CREATE_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert '
+    'AFTER INSERT ON posts_post BEGIN '
+    'INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete '
+    'AFTER DELETE ON posts_post BEGIN '
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_fts_update '
+    'AFTER UPDATE OF text ON posts_post BEGIN '
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); '
+    'END',
+]
+
+TRIGGERS = [
+    'posts_post_fts_insert',
+    'posts_post_fts_delete',
+    'posts_post_fts_update',
+]
+
+WORD = re.compile(r'\w+')
+
+
+def match_query(text):
+    """Запрос FTS5 из пользовательского текста: все слова должны
+    встретиться, последнее может быть началом слова.
+
+    Слова берутся в кавычки, так что синтаксис FTS5 (OR, NEAR,
+    двоеточия) в запросе пользователя ничего не ломает.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return None
+    *words, last = words
+    return ' '.join([*(f'"{word}"' for word in words), f'"{last}"*'])
+
+
+def filter_matching(queryset, text):
+    """Оставляем в queryset постов только подходящие под запрос"""
+    query = match_query(text)
+    if query is None:
+        return queryset.none()
+    # RawSQL в pk__in получил бы вторые скобки и стал бы скалярным
+    # подзапросом, поэтому условие пишем через extra()
+    return queryset.extra(
+        where=[
+            'posts_post.id IN (SELECT rowid FROM posts_post_fts '
+            'WHERE posts_post_fts MATCH %s)'
+        ],
+        params=[query],
+    )
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Перестраиваем индекс по posts_post и возвращаем триггеры"""
+    with connections[using].cursor() as cursor:
+        for sql in CREATE_TRIGGERS:
+            cursor.execute(sql)
+        cursor.execute(
+            "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+        )
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Обработчик post_migrate: возвращаем пропавшие триггеры.
+
+    Посты, записанные без триггеров, в индекс не попали, поэтому
+    индекс перестраивается. Без таблицы индекса (миграции откачены
+    до 0013) ничего не делаем.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)',
+            ['posts_post_fts', *TRIGGERS],
+        )
+        names = {name for name, in cursor.fetchall()}
+    if 'posts_post_fts' in names and not names.issuperset(TRIGGERS):
+        rebuild(using)
+
+
+def encode_cursor(rank, pk):
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{pk}'))
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        return float(rank), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+class SearchPage(KeysetPage):
+    """Страница результатов поиска; курсор - (rank, id)"""
+
+    def __init__(self, object_list, ranks, has_next, has_previous):
+        super().__init__(object_list, has_next, has_previous)
+        self.ranks = ranks
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.ranks[-1], self.object_list[-1].pk)
+        return None
+
+    @property
+    def previous_cursor(self):
+        return None
+
+
+def search(text, per_page, group=None, author=None, after=None):
+    """Страница постов, подходящих под text, от самых релевантных.
+
+    group и author сужают поиск; after - курсор предыдущей страницы.
+    """
+    query = match_query(text or '')
+    after = after and decode_cursor(after)
+    if query is None:
+        return SearchPage([], [], has_next=False, has_previous=False)
+    sql = [
+        'SELECT posts_post.id, posts_post_fts.rank FROM posts_post_fts '
+        'JOIN posts_post ON posts_post.id = posts_post_fts.rowid '
+        'WHERE posts_post_fts MATCH %s'
+    ]
+    params = [query]
+    if group is not None:
+        sql.append('AND posts_post.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        sql.append('AND posts_post.author_id = %s')
+        params.append(author.pk)
+    if after:
+        sql.append(
+            'AND (posts_post_fts.rank > %s '
+            'OR (posts_post_fts.rank = %s AND posts_post.id > %s))'
+        )
+        params.extend([after[0], after[0], after[1]])
+    sql.append('ORDER BY posts_post_fts.rank, posts_post.id LIMIT %s')
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        rows = cursor.fetchall()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _ in rows]
+    )
+    # Пост могли удалить между запросами - пропускаем его
+    rows = [(pk, rank) for pk, rank in rows if pk in posts]
+    return SearchPage(
+        [posts[pk] for pk, _ in rows],
+        [rank for _, rank in rows],
+        has_next=has_next,
+        has_previous=bool(after),
+    )
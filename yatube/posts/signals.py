@@ -0,0 +1,225 @@
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from . import (
+    caching, counters, images, object_cache, thumbnails, timelines
+)
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора"""
+    if created:
+        timelines.push(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """При подписке в ленту добавляются посты автора"""
+    if created:
+        timelines.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """При отписке посты автора уходят из ленты"""
+    timelines.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # При смене группы пост уходит и из ленты прежней группы
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(pre_save, sender=Post)
+def describe_post_image(sender, instance, **kwargs):
+    """Размер и хэш новой картинки считаем до ее записи в хранилище"""
+    images.describe(instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_files(sender, instance, **kwargs):
+    instance._initial_files = images.field_files(instance)
+    instance._initial_image = images.committed(instance, 'image')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_uploads(sender, instance, **kwargs):
+    instance._uploads = images.uploads(instance)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_files(sender, instance, **kwargs):
+    """Замененная или удаленная из поста картинка теряет ссылку.
+
+    Загрузка добавляет ссылку, даже если содержимое не изменилось
+    и имя файла осталось прежним: тогда прежняя ссылка тоже снимается.
+    """
+    files = images.field_files(instance)
+    images.release({
+        name for field, name in instance._initial_files.items()
+        if name not in files.values() or field in instance._uploads
+    })
+    instance._initial_files = files
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_files(sender, instance, **kwargs):
+    images.release(images.files(instance))
+
+
+@receiver(post_save, sender=Post)
+def build_thumbnails(sender, instance, **kwargs):
+    """Новой картинке строим миниатюры, откуда бы ни сохранили пост"""
+    image = images.committed(instance, 'image')
+    if image and image != instance._initial_image:
+        thumbnails.enqueue(instance)
+    instance._initial_image = image
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._initial_slug = instance.slug
+
+
+def user_names(user):
+    # Из __dict__: отложенные поля не стоят запроса
+    return tuple(
+        user.__dict__.get(field)
+        for field in ('username', 'first_name', 'last_name')
+    )
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._initial_username = instance.__dict__.get('username')
+    instance._initial_names = user_names(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    """Пост изменился - сбрасываем ленты, в которых он виден"""
+    group_ids = {instance.group_id, instance._initial_group_id} - {None}
+    group_slugs = Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True) if group_ids else []
+    caching.bump(
+        'index',
+        f'profile:{instance.author_id}',
+        f'post:{instance.pk}',
+        *(f'group:{slug}' for slug in group_slugs),
+    )
+    # У закэшированных групп поменялось число постов
+    object_cache.groups.invalidate(*group_slugs)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_total_posts(1)
+        counters.change_user(instance.author_id, posts_count=1)
+        counters.change(Group, instance.group_id, posts_count=1)
+    elif instance.group_id != instance._initial_group_id:
+        counters.change(Group, instance._initial_group_id, posts_count=-1)
+        counters.change(Group, instance.group_id, posts_count=1)
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_total_posts(-1)
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change(Group, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    caching.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Post, instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def check_timeline_mode(sender, instance, created=True, **kwargs):
+    """Режим ленты автора зависит от числа подписчиков: проверяем
+    его после обновления счетчиков"""
+    if created:
+        timelines.check_mode(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    """На профилях видны кнопка подписки и счетчики подписок"""
+    caching.bump(
+        f'profile:{instance.author_id}',
+        f'profile:{instance.user_id}',
+    )
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    object_cache.users.invalidate(
+        instance.username, instance._initial_username
+    )
+    instance._initial_username = instance.username
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_author(sender, instance, created, **kwargs):
+    """Имя автора есть на его профиле, карточках и страницах его
+    постов во всех лентах: после переименования сбрасываем все"""
+    names = user_names(instance)
+    if not created and names != instance._initial_names:
+        caching.bump(caching.ALL_FEEDS)
+    instance._initial_names = names
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feed(sender, instance, **kwargs):
+    caching.bump(f'group:{instance.slug}', f'group:{instance._initial_slug}')
+    object_cache.groups.invalidate(instance.slug, instance._initial_slug)
+    instance._initial_slug = instance.slug
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_all_feeds(sender, instance, **kwargs):
+    object_cache.groups.invalidate(instance.slug, instance._initial_slug)
+    # Посты группы отвязываются без сигналов - сбрасываем все ленты
+    caching.bump(caching.ALL_FEEDS)
@@ -0,0 +1,112 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется по SHA-256 своего содержимого: posts/ab/abcd...jpg.
+Одна и та же картинка, загруженная в несколько постов, хранится один
+раз, и миниатюры sorl, которые называются по имени исходника, у таких
+постов тоже общие.
+
+Содержимое пишется кусками во временный файл рядом с целевым и
+хэшируется по дороге, затем файл переименовывается в имя по хэшу
+(или удаляется, если такой файл уже есть). Число ссылок на файл
+хранится в StoredImage: save() добавляет ссылку, release() снимает и
+удаляет файл вместе с последней. Ссылки и файл меняются в одной
+транзакции базы, поэтому освобождение не удалит файл, который
+в этот момент сохраняется заново.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage с именами по хэшу и подсчетом ссылок"""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя по хэшу станет известно только при записи; совпадение
+        # с существующим файлом означает то же содержимое
+        return name
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        temporary, digest, size = self._write_temporary(directory, content)
+        name = posixpath.join(
+            directory, digest[:2], f'{digest}{extension}'
+        )
+        try:
+            with transaction.atomic():
+                self.retain(name, size)
+                path = self.path(name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Тот же файл перезаписывается тем же содержимым
+                os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def _write_temporary(self, directory, content):
+        """Пишем content кусками во временный файл, считая SHA-256"""
+        directory = self.path(directory)
+        os.makedirs(directory, exist_ok=True)
+        temporary = os.path.join(directory, f'.{uuid.uuid4().hex}.part')
+        # os.open, а не mkstemp: права файла - по umask, как у Django
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return temporary, sha256.hexdigest(), size
+
+    def retain(self, name, size):
+        """Добавляем ссылку на файл"""
+        from .models import StoredImage
+
+        stored, created = StoredImage.objects.get_or_create(
+            name=name, defaults={'size': size, 'refs': 1}
+        )
+        if not created:
+            StoredImage.objects.filter(pk=stored.pk).update(
+                refs=F('refs') + 1
+            )
+
+    def release(self, name):
+        """Снимаем ссылку на файл; вернет True, если файл удален.
+
+        Файлы, сохраненные до появления подсчета ссылок, не трогаем.
+        """
+        from .models import StoredImage
+
+        with transaction.atomic():
+            stored = StoredImage.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is None:
+                return False
+            if stored.refs > 1:
+                StoredImage.objects.filter(pk=stored.pk).update(
+                    refs=F('refs') - 1
+                )
+                return False
+            stored.delete()
+            self.delete(name)
+        return True
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,27 @@
+# posts/templatetags/follow_button.py
+from django import template
+
+from posts.models import Follow
+
+register = template.Library()
+
+
+def is_following(request, username):
+    """Подписан ли пользователь запроса на автора.
+
+    Ответ запоминается на время запроса: view профиля и фрагмент
+    с кнопкой подписки спрашивают одно и то же.
+    """
+    if not request.user.is_authenticated:
+        return False
+    following = request.__dict__.setdefault('_following', {})
+    if username not in following:
+        following[username] = Follow.objects.filter(
+            user=request.user, author__username=username
+        ).exists()
+    return following[username]
+
+
+@register.simple_tag(takes_context=True)
+def following(context, username):
+    return is_following(context['request'], username)
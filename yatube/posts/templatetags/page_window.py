@@ -0,0 +1,17 @@
+# posts/templatetags/page_window.py
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj):
+    """Номера страниц для навигации: {% page_window page_obj as window %}.
+
+    CountingPaginator отдает окно вокруг текущей страницы с
+    многоточиями, обычный Paginator - все номера.
+    """
+    paginator = page_obj.paginator
+    if hasattr(paginator, 'get_elided_page_range'):
+        return list(paginator.get_elided_page_range(page_obj.number))
+    return paginator.page_range
@@ -0,0 +1,21 @@
+# posts/templatetags/post_cards.py
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.caching import get_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кэша.
+
+    При первом вызове на странице карточки всех постов page_obj
+    достаются из кэша разом и запоминаются до конца отрисовки.
+    """
+    cards = context.render_context.get('post_cards')
+    if cards is None or post.pk not in cards:
+        cards = get_cards(list(context.get('page_obj') or [post]))
+        context.render_context['post_cards'] = cards
+    return mark_safe(cards[post.pk])
@@ -0,0 +1,64 @@
+# posts/templatetags/post_thumbnails.py
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import ready_thumbnail, ready_thumbnail_sizes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, size):
+    """Готовая миниатюра картинки: {% post_thumbnail post.image 'card'
+    as im %}. Картинка при этом не читается; если миниатюру еще не
+    построили, возвращается None.
+
+    Миниатюры, найденные заранее для всей страницы, передаются
+    в контексте: {'post_thumbnails': {размер: {имя картинки: ...}}}.
+    """
+    prefetched = context.get('post_thumbnails', {}).get(size, {})
+    if image and image.name in prefetched:
+        return prefetched[image.name]
+    return ready_thumbnail(image, size)
+
+
+@register.inclusion_tag('includes/post_image.html', takes_context=True)
+def post_image(context, post):
+    """Картинка поста: {% post_image post %}.
+
+    Отдает <img> с loading="lazy", шириной и высотой и srcset из
+    готовых миниатюр POST_IMAGE_SRCSET. Пока миниатюр нет, показывается
+    исходная картинка с размерами из колонок поста и ее WebP-копией
+    в <picture>. Файл картинки не открывается.
+    """
+    image = post.image
+    if not image:
+        return {'image': None}
+    sizes = settings.POST_IMAGE_SRCSET
+    prefetched = context.get('post_thumbnails', {})
+    if all(image.name in prefetched.get(size, {}) for size in sizes):
+        thumbnails = [prefetched[size][image.name] for size in sizes]
+    else:
+        found = ready_thumbnail_sizes([image], sizes)
+        thumbnails = [found[size][image.name] for size in sizes]
+    thumbnails = [thumbnail for thumbnail in thumbnails if thumbnail]
+    if not thumbnails:
+        return {
+            'image': {
+                'url': image.url,
+                'width': post.image_width,
+                'height': post.image_height,
+                'webp': post.image_webp.url if post.image_webp else None,
+            },
+        }
+    largest = thumbnails[-1]
+    return {
+        'image': {
+            'url': largest.url,
+            'width': largest.width,
+            'height': largest.height,
+        },
+        'srcset': ', '.join(
+            f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails
+        ),
+    }
@@ -0,0 +1,272 @@
+# posts/tests/test_caching.py
+import time
+from unittest import mock
+
+from django.urls import reverse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.fragments import decode, encode, fill, placeholder
+
+from ..caching import card_stats, expiring, get_cards, page_key
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTests(TestCase):
+    """Тесты кэша карточек постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Имя', last_name='Фамилия'
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {index}')
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_cached_until_post_changes(self):
+        get_cards(self.posts)
+        self.assertEqual(card_stats(), {'hits': 0, 'misses': 3})
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        cards = get_cards([post, *self.posts[1:]])
+        self.assertEqual(card_stats(), {'hits': 2, 'misses': 4})
+        self.assertIn('Исправленный пост', cards[post.pk])
+
+    def test_author_rename_changes_card(self):
+        get_cards(self.posts)
+        self.user.first_name = 'Другое'
+        get_cards(self.posts)
+        self.assertEqual(card_stats(), {'hits': 0, 'misses': 6})
+
+    def test_feed_renders_cached_cards(self):
+        response = Client().get(reverse('posts:index'))
+        for post in self.posts:
+            self.assertContains(response, post.text)
+        self.assertContains(response, 'Имя Фамилия')
+        self.assertEqual(card_stats()['misses'], 3)
+
+
+class FeedPageCacheTests(TestCase):
+    """Тесты защиты страниц лент от одновременной перестройки"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+        request = RequestFactory().get(self.url)
+        request.user = AnonymousUser()
+        self.lock = page_key(request, 'index') + ':lock'
+
+    def test_stale_page_served_while_rebuilding(self):
+        Client().get(self.url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        # Страницу уже перестраивает другой запрос
+        cache.set(self.lock, True)
+        self.assertNotContains(Client().get(self.url), 'Свежий пост')
+        cache.delete(self.lock)
+        self.assertContains(Client().get(self.url), 'Свежий пост')
+        self.assertFalse(cache.has_key(self.lock))
+
+    def test_stale_page_keeps_its_etag(self):
+        etag = Client().get(self.url)['ETag']
+        Post.objects.create(author=self.user, text='Свежий пост')
+        cache.set(self.lock, True)
+        stale = Client().get(self.url)
+        self.assertEqual(stale['ETag'], etag)
+        cache.delete(self.lock)
+        # Устаревшую копию не подтверждают ответом 304
+        response = Client().get(self.url, HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertContains(response, 'Свежий пост')
+
+    def test_without_stale_page_view_runs(self):
+        cache.set(self.lock, True)
+        self.assertContains(Client().get(self.url), 'Старый пост')
+
+    def test_early_recomputation(self):
+        entry = (None, None, time.time() + 1, 10)
+        with mock.patch('random.random', return_value=0.99):
+            self.assertTrue(expiring(entry))
+            with override_settings(CACHE_FEED_EARLY_BETA=0):
+                self.assertFalse(expiring(entry))
+        self.assertTrue(expiring((None, None, time.time() - 1, 0)))
+
+
+class SharedPageCacheTests(TestCase):
+    """Одна копия страницы в кэше на гостей и пользователей"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_users_share_cached_page(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        response = Client().get(url)
+        self.assertContains(response, 'Войти')
+        self.assertContains(response, 'Подписаться')
+        # Изменение в обход сигналов: видно только без кэша
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.reader_client.get(url)
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Старый пост')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Отписаться')
+        self.assertNotContains(response, 'Войти')
+        self.assertNotContains(response, '<!--fragment:')
+        author_client = Client()
+        author_client.force_login(self.author)
+        response = author_client.get(url)
+        self.assertNotContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Отписаться')
+
+    def test_fragment_params_keep_types(self):
+        for params in (
+            {'index': False},
+            {'index': None, 'page': 0},
+            {'author': 'a&b=c -->'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(decode(encode(params)), params)
+        request = RequestFactory().get('/')
+        request.user = self.reader
+        html = fill(
+            request, placeholder('includes/switcher.html', {'index': False})
+        )
+        self.assertIn('Все авторы', html)
+        self.assertNotIn('active', html)
+
+    def test_switcher_only_for_users(self):
+        url = reverse('posts:index')
+        self.assertNotContains(Client().get(url), 'Избранные авторы')
+        self.assertContains(self.reader_client.get(url), 'Избранные авторы')
+
+
+class PostDetailCacheTests(TestCase):
+    """Тесты кэша страницы поста"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_hit_needs_no_queries(self):
+        Client().get(self.url)
+        with self.assertNumQueries(0):
+            response = Client().get(self.url)
+        self.assertContains(response, 'Старый пост')
+
+    def test_invalidated_by_edit_and_comment(self):
+        Client().get(self.url)
+        self.author_client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Исправленный пост'},
+        )
+        self.assertContains(Client().get(self.url), 'Исправленный пост')
+        self.author_client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Новый комментарий'},
+        )
+        self.assertContains(Client().get(self.url), 'Новый комментарий')
+
+
+class ConditionalGetTests(TestCase):
+    """Тесты ответов 304 по ETag"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Старый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def test_unchanged_pages_answer_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = Client().get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_give_new_etag(self):
+        etags = [Client().get(url)['ETag'] for url in self.urls]
+        Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group
+        )
+        Comment.objects.create(
+            author=self.author, post=self.post, text='Комментарий'
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_session(self):
+        client = Client()
+        client.force_login(self.author)
+        url = self.urls[0]
+        self.assertNotEqual(Client().get(url)['ETag'], client.get(url)['ETag'])
+
+    def test_author_rename_changes_etags(self):
+        etags = [Client().get(url)['ETag'] for url in self.urls]
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(Client().get(self.urls[0]), 'Лев')
+
+    def test_post_signals_do_not_load_author(self):
+        post = Post.objects.get(pk=self.post.pk)
+        with CaptureQueriesContext(connection) as context:
+            post.save()
+            Follow.objects.create(user=self.author, author=self.reader)
+        self.assertFalse(any(
+            'FROM "auth_user"' in query['sql']
+            for query in context.captured_queries
+        ))
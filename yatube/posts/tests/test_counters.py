@@ -0,0 +1,109 @@
+# posts/tests/test_counters.py
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from ..models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    """Тесты денормализованных счетчиков"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def counters(self, user):
+        counters = UserCounters.objects.get(user=user)
+        return (
+            counters.posts_count,
+            counters.followers_count,
+            counters.following_count,
+        )
+
+    def test_posts_and_groups(self):
+        post = Post.objects.create(
+            author=self.author, text='Тестовый пост', group=self.group
+        )
+        self.assertEqual(self.counters(self.author), (1, 0, 0))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.other_group.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(
+            (self.group.posts_count, self.other_group.posts_count), (0, 1)
+        )
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+
+    def test_comments(self):
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='Тестовый комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follows(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author), (0, 1, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 1))
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.create(
+            author=self.author, text='Тестовый пост', group=self.group
+        )
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        UserCounters.objects.filter(user=self.reader).delete()
+        Group.objects.update(posts_count=5)
+        call_command(
+            'reconcile_counters', batch_size=1, stdout=StringIO()
+        )
+        self.assertEqual(self.counters(self.author), (1, 0, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 0))
+        self.assertEqual(
+            list(Group.objects.order_by('pk').values_list(
+                'posts_count', flat=True
+            )),
+            [1, 0],
+        )
+
+    def test_deleting_author_keeps_counters_consistent(self):
+        author = User.objects.create_user(username='leaving')
+        Follow.objects.create(user=self.reader, author=author)
+        Post.objects.create(author=author, text='Тестовый пост')
+        author.delete()
+        self.assertEqual(self.counters(self.reader), (0, 0, 0))
+
+    def test_profile_without_counters_row(self):
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        UserCounters.objects.filter(user=self.author).delete()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 1)
@@ -90,7 +90,7 @@ class FormsTests(TestCase):
                 text='Текст поста',
                 group=FormsTests.group,
                 author=FormsTests.user,
-                image='posts/small.gif'
+                image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
             ).exists()
         )
         # Следующие три проверки сделаны
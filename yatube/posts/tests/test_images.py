@@ -0,0 +1,247 @@
+# posts/tests/test_images.py
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from PIL import Image
+
+from ..models import Post
+from ..thumbnails import ready_thumbnail
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageMetadataTests(TestCase):
+    """Тесты сведений о картинках постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def test_upload_records_metadata(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с картинкой', 'image': self.upload('small.gif')},
+        )
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        with post.image.open('rb') as file:
+            content = file.read()
+        self.assertEqual(post.image_bytes, len(content))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(content).hexdigest()
+        )
+        # Сохранение без новой картинки сведения не пересчитывает
+        with mock.patch('posts.images.digest') as digest:
+            post.text = 'Новый текст'
+            post.save()
+        digest.assert_not_called()
+
+    def test_removed_image_clears_metadata(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('gone.gif')
+        )
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertIsNone(post.image_bytes)
+        self.assertEqual(post.image_hash, '')
+
+    def test_templates_do_not_open_image(self):
+        # Миниатюр еще нет - страница показывает исходник
+        with mock.patch('posts.thumbnails.enqueue'):
+            post = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload('lazy.gif')
+            )
+        with mock.patch.object(FileSystemStorage, 'open') as storage_open:
+            response = self.client.get(reverse('posts:index'))
+        storage_open.assert_not_called()
+        self.assertContains(
+            response,
+            f'src="{post.image.url}" loading="lazy"\n    '
+            'width="2" height="1"',
+        )
+        self.assertNotContains(response, 'srcset=')
+
+    def test_missing_file_does_not_break_feed(self):
+        Post.objects.create(
+            author=self.user, text='Пост', image='posts/gone/missing.gif'
+        )
+        post = Post.objects.get()
+        self.assertIsNone(post.image_width)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'src="/media/posts/gone/missing.gif"')
+
+    def test_srcset_lists_thumbnails(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('thumbs.gif')
+        )
+        small = ready_thumbnail(post.image, 'card_small')
+        card = ready_thumbnail(post.image, 'card')
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=[post.pk]),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertContains(
+                    response, f'width="{card.width}" height="{card.height}"'
+                )
+                self.assertContains(
+                    response,
+                    f'srcset="{small.url} {small.width}w, '
+                    f'{card.url} {card.width}w"',
+                )
+
+    def test_backfill_command(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('old.gif')
+        )
+        # Другое содержимое - другой файл в хранилище
+        missing = Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image=SimpleUploadedFile(
+                'lost.gif', SMALL_GIF.replace(b'\xFF' * 3, b'\x00' * 3)
+            ),
+        )
+        Post.objects.update(
+            image_width=None, image_height=None,
+            image_bytes=None, image_hash='',
+        )
+        missing.image.storage.delete(missing.image.name)
+        out = StringIO()
+        call_command('backfill_image_metadata', batch_size=1, stdout=out)
+        self.assertIn('Дописано картинок: 1', out.getvalue())
+        self.assertIn('Файлов не найдено: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_bytes, len(SMALL_GIF))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest()
+        )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_WORKERS=0,
+    POST_IMAGE_MAX_SIDE=100,
+)
+class UploadNormalizationTests(TestCase):
+    """Тесты нормализации загруженных картинок"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def photo(self, name='photo.jpg', size=(400, 200)):
+        """Снимок с EXIF: повернут на 90 градусов и с моделью камеры"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Телефон'
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        return SimpleUploadedFile(
+            name=name, content=buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    def test_upload_is_rotated_downscaled_and_stripped(self):
+        # Без миниатюр страница показывает исходник и его WebP-копию
+        with mock.patch('posts.thumbnails.enqueue'):
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Снимок', 'image': self.photo()},
+            )
+        post = Post.objects.get()
+        self.assertRegex(post.image.name, r'^posts/\w{2}/\w{64}\.jpg$')
+        self.assertRegex(post.image_webp.name, r'^posts/\w{2}/\w{64}\.webp$')
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        for image, format in ((post.image, 'JPEG'), (post.image_webp, 'WEBP')):
+            with self.subTest(format=format), Image.open(image.path) as im:
+                self.assertEqual(im.format, format)
+                self.assertEqual(im.size, (50, 100))
+                self.assertEqual(len(im.getexif()), 0)
+        self.assertContains(
+            self.client.get(reverse('posts:post_detail', args=[post.pk])),
+            f'<source type="image/webp" srcset="{post.image_webp.url}">',
+        )
+
+    def test_huge_image_is_rejected_by_header(self):
+        # Отказ - до декодирования картинки
+        with override_settings(POST_IMAGE_MAX_PIXELS=1000), \
+                mock.patch('posts.images.ImageOps.exif_transpose') as decode:
+            response = self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Снимок', 'image': self.photo()},
+            )
+        decode.assert_not_called()
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: не больше 1000 пикселей',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_removed_image_removes_webp(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Снимок', 'image': self.photo()},
+        )
+        post = Post.objects.get()
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Без снимка', 'image-clear': 'on'},
+        )
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertFalse(post.image_webp)
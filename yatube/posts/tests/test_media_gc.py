@@ -0,0 +1,152 @@
+# posts/tests/test_media_gc.py
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from sorl.thumbnail import default
+
+from ..media_gc import Collector, Throttle, checkpoint_key, walk
+from ..models import Post, StoredImage
+from ..storage import image_storage
+from ..thumbnails import ready_thumbnail
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaGarbageCollectorTests(TestCase):
+    """Тесты сборщика мусора в медиа"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.kept = self.create(b'\xFF\xFF\xFF')
+        self.dropped = self.create(b'\x00\x00\x00')
+        self.kept_thumbnail = ready_thumbnail(self.kept.image, 'card')
+        self.dropped_thumbnail = ready_thumbnail(self.dropped.image, 'card')
+        # Ссылка пропала без сигналов, как при удалении без них
+        Post.objects.filter(pk=self.dropped.pk).update(image='')
+        self.legacy = self.write(image_storage, 'posts/legacy.gif')
+        self.stray = self.write(default.storage, 'cache/00/00/stray.jpg')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, color):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF.replace(b'\xFF' * 3, color)
+            ),
+        )
+
+    def write(self, storage, name):
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        return path
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command(
+            'collect_media', '--min-age=0', '-v2', *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        out = self.collect('--dry-run')
+        self.assertIn(f'originals: {self.dropped.image.name}', out)
+        self.assertIn('originals: posts/legacy.gif', out)
+        self.assertIn('thumbnails: cache/00/00/stray.jpg', out)
+        self.assertIn('Картинки без постов: 2', out)
+        self.assertIn('Пробный запуск', out)
+        for path in (self.dropped.image.path, self.legacy, self.stray):
+            self.assertTrue(os.path.exists(path))
+
+    def test_unreferenced_files_are_deleted(self):
+        self.collect()
+        for path in (self.dropped.image.path, self.legacy, self.stray):
+            with self.subTest(path=path):
+                self.assertFalse(os.path.exists(path))
+        self.assertFalse(self.dropped_thumbnail.exists())
+        self.assertIsNone(ready_thumbnail(self.dropped.image, 'card'))
+        self.assertFalse(
+            StoredImage.objects.filter(name=self.dropped.image.name).exists()
+        )
+        self.assertTrue(os.path.exists(self.kept.image.path))
+        self.assertTrue(self.kept_thumbnail.exists())
+        self.assertEqual(
+            ready_thumbnail(self.kept.image, 'card').name,
+            self.kept_thumbnail.name,
+        )
+        self.assertIn('Картинки без постов: 0', self.collect())
+
+    def test_young_files_are_kept(self):
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+        self.assertIn('Картинки без постов: 0', out.getvalue())
+        self.assertTrue(os.path.exists(self.legacy))
+
+    def test_interrupted_run_resumes(self):
+        def interrupt(phase, name, size):
+            if name == 'posts/legacy.gif':
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            Collector(batch_size=1, min_age=0, report=interrupt).run()
+        self.assertIsNotNone(cache.get(checkpoint_key(dry_run=False)))
+        self.assertFalse(os.path.exists(self.dropped.image.path))
+        seen = []
+        Collector(
+            batch_size=1,
+            min_age=0,
+            report=lambda phase, name, size: seen.append(name),
+        ).run()
+        self.assertEqual(
+            seen, ['posts/legacy.gif', 'cache/00/00/stray.jpg']
+        )
+        self.assertIsNone(cache.get(checkpoint_key(dry_run=False)))
+
+    def test_walk_matches_string_order(self):
+        for name in ('posts/a.gif', 'posts/a/b.gif', 'posts/a0.gif'):
+            self.write(image_storage, name)
+        names = [name for name, _ in walk(image_storage, 'posts')]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(
+            [name for name, _ in walk(image_storage, 'posts', 'posts/a.gif')],
+            [name for name in names if name > 'posts/a.gif'],
+        )
+
+    def test_throttle_limits_rate(self):
+        with mock.patch('posts.media_gc.time.sleep') as sleep:
+            throttle = Throttle(10)
+            for _ in range(3):
+                throttle()
+        self.assertEqual(sleep.call_count, 2)
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -41,3 +42,22 @@ class PostModelTest(TestCase):
             PostModelTest.post._meta.get_field('group').help_text,
             'Группа, к которой относится пост'
         )
+
+
+class FollowModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_follow_is_unique(self):
+        """Повторная подписка не создает вторую строку."""
+        Follow.objects.create(user=FollowModelTest.user,
+                              author=FollowModelTest.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=FollowModelTest.user,
+                                  author=FollowModelTest.author)
+        Follow.objects.get_or_create(user=FollowModelTest.user,
+                                     author=FollowModelTest.author)
+        self.assertEqual(Follow.objects.count(), 1)
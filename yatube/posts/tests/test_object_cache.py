@@ -0,0 +1,95 @@
+# posts/tests/test_object_cache.py
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+
+from ..models import Comment, Group, Post
+from ..object_cache import groups, users
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    """Тесты кэша групп и авторов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        groups.clear_local()
+        users.clear_local()
+
+    def test_cached_lookups_skip_database(self):
+        self.assertEqual(groups.get(self.group.slug), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get(self.group.slug), self.group)
+        # Второй уровень: процесс без своей копии берет общий кэш
+        groups.clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get(self.group.slug), self.group)
+
+    def test_copies_do_not_share_state(self):
+        group = groups.get(self.group.slug)
+        group.title = 'Изменено в запросе'
+        self.assertEqual(groups.get(self.group.slug).title, self.group.title)
+
+    def test_missing_objects_are_cached(self):
+        self.assertIsNone(users.get('nobody'))
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                users.get_or_404('nobody')
+        # Новый пользователь с тем же именем виден сразу
+        created = User.objects.create_user(username='nobody')
+        self.assertEqual(users.get('nobody'), created)
+
+    def test_invalidated_on_change(self):
+        users.get(self.user.username)
+        groups.get(self.group.slug)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertIsNone(users.get('auth'))
+        self.assertEqual(users.get('renamed'), self.user)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(groups.get(self.group.slug).title, 'Новое название')
+        group.delete()
+        self.assertIsNone(groups.get(self.group.slug))
+
+    def test_views_use_cache(self):
+        response = Client().get(reverse('posts:profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            response = Client().get(
+                reverse('posts:profile', args=['nobody'])
+            )
+        self.assertEqual(response.status_code, 404)
+
+    def test_private_fields_are_not_cached(self):
+        users.get('auth')
+        self.assertEqual(
+            cache.get(users.key('auth')), (self.user.pk, 'auth', '', '')
+        )
+        author = users.get('auth')
+        self.assertEqual(author.pk, self.user.pk)
+        self.assertIn('password', author.get_deferred_fields())
+        self.assertIn('email', author.get_deferred_fields())
+
+    def test_post_detail_cache_skips_private_fields(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        Client().get(reverse('posts:post_detail', args=[post.pk]))
+        _, data = cache.get(f'post-detail:{post.pk}')
+        for author in (data['post'].author, data['comments'][0].author):
+            with self.subTest(author=author):
+                self.assertIn('password', author.get_deferred_fields())
+                self.assertIn('email', author.get_deferred_fields())
@@ -0,0 +1,299 @@
+# posts/tests/test_paginators.py
+from unittest import mock
+
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page
+
+from django.conf import settings
+
+from ..counters import total_posts
+from ..models import Comment, Group, Post
+from ..object_cache import groups
+from ..paginators import (
+    CountingPaginator, KeysetPage, KeysetPaginator, decode_cursor
+)
+
+User = get_user_model()
+
+POSTS_COUNT = settings.POSTS_ON_PAGE * 2 + 3
+POSTS_ON_PAGE_PLUS_ONE = settings.POSTS_ON_PAGE + 1
+COMMENTS_COUNT = settings.COMMENTS_ON_PAGE * 2 + 3
+
+
+@override_settings(
+    KEYSET_PAGINATION_FEEDS=['index', 'group_list', 'profile']
+)
+class KeysetPaginatorTests(TestCase):
+    """Тесты пагинации по курсору"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        # bulk_create дает постам почти одинаковые pub_date,
+        # так что порядок держится на id
+        Post.objects.bulk_create(
+            Post(
+                author=cls.user,
+                text=f'Тестовый пост {index}',
+                group=cls.group,
+            )
+            for index in range(POSTS_COUNT)
+        )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def walk(self, url):
+        """Проходим ленту по ссылкам 'Следующая' до конца"""
+        seen = []
+        params = {}
+        while True:
+            page_obj = self.client.get(url, params).context['page_obj']
+            self.assertIsInstance(page_obj, KeysetPage)
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.has_next():
+                return seen
+            params = {'after': page_obj.next_cursor}
+
+    def test_feeds_walk_all_posts_in_order(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(url), expected)
+
+    def test_new_posts_do_not_shift_pages(self):
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        again = paginator.get_page(after=first.next_cursor)
+        self.assertEqual(list(second), list(again))
+
+    def test_before_returns_previous_page(self):
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_gives_first_page(self):
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        self.assertIsNone(decode_cursor('мусор'))
+        self.assertEqual(
+            list(paginator.get_page(after='мусор')),
+            list(paginator.get_page()),
+        )
+
+    def test_template_renders_cursor_links(self):
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?after={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+
+class CountingPaginatorTests(TestCase):
+    """Тесты пагинатора с готовым числом постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        for index in range(settings.POSTS_ON_PAGE + 1):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый пост {index}',
+                group=cls.group,
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_feeds_use_stored_totals(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                paginator = response.context['page_obj'].paginator
+                self.assertIsInstance(paginator, CountingPaginator)
+                self.assertTrue(paginator.approximate)
+                self.assertEqual(paginator.count, POSTS_ON_PAGE_PLUS_ONE)
+                self.assertContains(response, 'около 2 стр.')
+
+    def test_index_total_follows_writes(self):
+        self.assertEqual(total_posts(), POSTS_ON_PAGE_PLUS_ONE)
+        with self.assertNumQueries(0):
+            total_posts()
+        Post.objects.create(author=self.user, text='Еще пост')
+        Post.objects.first().delete()
+        Post.objects.create(author=self.user, text='И еще пост')
+        with self.assertNumQueries(0):
+            self.assertEqual(total_posts(), POSTS_ON_PAGE_PLUS_ONE + 1)
+
+    def test_count_is_not_queried(self):
+        paginator = CountingPaginator(Post.objects.all(), 10, count=11)
+        with self.assertNumQueries(1):
+            list(paginator.get_page(2))
+
+    def test_without_count_is_exact(self):
+        paginator = CountingPaginator(Post.objects.all(), 10)
+        self.assertFalse(paginator.approximate)
+        self.assertEqual(paginator.count, POSTS_ON_PAGE_PLUS_ONE)
+
+    def test_stale_count_does_not_cut_pages(self):
+        paginator = CountingPaginator(Post.objects.all(), 10, count=1)
+        page_obj = paginator.get_page(1)
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(page_obj.has_next())
+        page_obj = paginator.get_page(2)
+        self.assertEqual(len(page_obj), 1)
+        self.assertFalse(page_obj.has_next())
+        # Страница за концом ленты отдает последнюю
+        self.assertEqual(paginator.get_page(5).number, 2)
+
+    def test_overcount_is_clamped(self):
+        drifts = []
+        paginator = CountingPaginator(
+            Post.objects.all(), 10, count=100,
+            on_drift=lambda: drifts.append(True),
+        )
+        page_obj = paginator.get_page(2)
+        self.assertEqual(len(page_obj), 1)
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(paginator.count, POSTS_ON_PAGE_PLUS_ONE)
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(drifts, [True])
+        # Страница, которой по счетчику хватало постов, отдает
+        # настоящую последнюю
+        paginator = CountingPaginator(Post.objects.all(), 10, count=100)
+        self.assertEqual(paginator.get_page(8).number, 2)
+        self.assertEqual(paginator.count, POSTS_ON_PAGE_PLUS_ONE)
+
+    @mock.patch('posts.counters.transaction.on_commit', lambda func: func())
+    def test_drift_recounts_counter(self):
+        Group.objects.filter(pk=self.group.pk).update(posts_count=100)
+        groups.invalidate(self.group.slug)
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug]), {'page': 5}
+        )
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertNotContains(response, 'около 10 стр.')
+        self.assertEqual(
+            groups.get(self.group.slug).posts_count, POSTS_ON_PAGE_PLUS_ONE
+        )
+
+    def test_page_window_is_bounded(self):
+        paginator = CountingPaginator(Post.objects.all(), 1, count=5000)
+        ellipsis = CountingPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, ellipsis, 5000],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2500)),
+            [1, ellipsis, 2498, 2499, 2500, 2501, 2502, ellipsis, 5000],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(5000)),
+            [1, ellipsis, 4998, 4999, 5000],
+        )
+        small = CountingPaginator(Post.objects.all(), 10, count=30)
+        self.assertEqual(list(small.get_elided_page_range(2)), [1, 2, 3])
+
+    def test_template_renders_page_window(self):
+        Group.objects.filter(pk=self.group.pk).update(posts_count=50000)
+        groups.invalidate(self.group.slug)
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        page_obj = response.context['page_obj']
+        self.assertIs(type(page_obj), Page)
+        self.assertEqual(
+            list(page_obj.paginator.get_elided_page_range(page_obj.number)),
+            [1, 2, 3, CountingPaginator.ELLIPSIS, 5000],
+        )
+        self.assertContains(response, 'class="page-item', count=8)
+
+
+class CommentsPaginationTests(TestCase):
+    """Тесты постраничной выдачи комментариев"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(
+                author=cls.user,
+                post=cls.post,
+                text=f'Тестовый комментарий {index}',
+            )
+            for index in range(COMMENTS_COUNT)
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_post_detail_inlines_first_page(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_ON_PAGE)
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=[self.post.pk])
+            + f'?after={comments.next_cursor}',
+        )
+
+    def test_fragments_walk_all_comments(self):
+        expected = list(
+            self.post.comments.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(url, params)
+            self.assertTemplateUsed(response, 'includes/comments.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            comments = response.context['comments']
+            seen.extend(comment.pk for comment in comments)
+            if not comments.has_next():
+                break
+            params = {'after': comments.next_cursor}
+        self.assertEqual(seen, expected)
+
+    def test_fragment_of_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1])
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,97 @@
+# posts/tests/test_query_budget.py
+from django.urls import reverse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core.query_budget import (
+    QueryBudgetExceeded, get_within_budget, query_budget
+)
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    """Страницы укладываются в объявленный бюджет запросов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        # Посты и комментарии разных авторов, чтобы N+1 был заметен
+        for index in range(15):
+            post = Post.objects.create(
+                author=(cls.author, cls.reader)[index % 2],
+                text=f'Тестовый пост {index}',
+                group=cls.group,
+            )
+            Comment.objects.create(
+                author=(cls.reader, cls.author)[index % 2],
+                post=post,
+                text=f'Тестовый комментарий {index}',
+            )
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_pages_within_budget(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=[self.post.pk]),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                get_within_budget(self.client, page)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_writes_within_budget(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'group': self.group.pk},
+        )
+        author_client = Client()
+        author_client.force_login(self.post.author)
+        author_client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Исправленный пост'},
+        )
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Новый комментарий'},
+        )
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_exceeded_budget_fails(self):
+        @query_budget(1)
+        def greedy_view(request):
+            list(User.objects.all())
+            list(Group.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            greedy_view(RequestFactory().get('/'))
@@ -0,0 +1,112 @@
+# posts/tests/test_search.py
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from ..models import Group, Post
+from ..search import match_query, search
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    """Тесты полнотекстового поиска"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.best = Post.objects.create(
+            author=cls.author, text='Кот, кот и еще раз кот', group=cls.group
+        )
+        cls.good = Post.objects.create(
+            author=cls.other, text='Кот и собака'
+        )
+        Post.objects.create(author=cls.other, text='Только собака')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_results_are_ranked(self):
+        self.assertEqual(list(search('кот', 10)), [self.best, self.good])
+        self.assertEqual(list(search('СОБАКА кот', 10)), [self.good])
+        self.assertEqual(list(search('соб', 10))[0].text, 'Только собака')
+
+    def test_scoping(self):
+        self.assertEqual(list(search('кот', 10, group=self.group)), [
+            self.best
+        ])
+        self.assertEqual(list(search('кот', 10, author=self.other)), [
+            self.good
+        ])
+
+    def test_index_follows_changes(self):
+        Post.objects.bulk_create([Post(author=self.other, text='Попугай')])
+        self.assertEqual(len(search('попугай', 10)), 1)
+        Post.objects.filter(text='Попугай').update(text='Хомяк')
+        self.assertEqual(len(search('попугай', 10)), 0)
+        self.assertEqual(len(search('хомяк', 10)), 1)
+        Post.objects.filter(text='Хомяк').delete()
+        self.assertEqual(len(search('хомяк', 10)), 0)
+
+    def test_triggers_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        # Пост, записанный без триггера, попадет в индекс при перестройке
+        post = Post.objects.create(author=self.author, text='Потерянный кот')
+        emit_post_migrate_signal(0, False, DEFAULT_DB_ALIAS)
+        self.assertIn(post, search('потерянный', 10))
+        fresh = Post.objects.create(author=self.author, text='Найденный кот')
+        self.assertEqual(list(search('найденный', 10)), [fresh])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertIsNone(match_query(' "*: '))
+        self.assertEqual(match_query('кот OR NEAR'), '"кот" "OR" "NEAR"*')
+        self.assertEqual(len(search('кот" OR "собака', 10)), 0)
+
+    def test_keyset_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.other, text=f'Кот номер {index}')
+            for index in range(7)
+        )
+        seen = []
+        after = None
+        while True:
+            page = search('кот', 3, after=after)
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            after = page.next_cursor
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(len(set(seen)), 9)
+        self.assertEqual(seen[0], self.best.pk)
+
+    def test_search_page(self):
+        response = Client().get(
+            reverse('posts:search'), {'q': 'кот', 'author': 'author'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.best])
+        self.assertContains(response, self.best.text)
+        response = Client().get(
+            reverse('posts:search'), {'q': 'кот', 'group': 'missing'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
@@ -0,0 +1,105 @@
+# posts/tests/test_shared_cache.py
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+from django.core.cache import cache as default_cache
+from django.conf import settings
+
+from core.shared_cache import SharedCache
+
+
+class SharedCacheTests(SimpleTestCase):
+    """Тесты общего кэша в файле SQLite"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options.setdefault('COMPRESS_MIN_BYTES', 100)
+        return SharedCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_basic_operations(self):
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'другое'))
+        self.assertTrue(cache.add('new', 'значение'))
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter', 2), 3)
+        self.assertEqual(cache.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete('a')
+        self.assertFalse(cache.has_key('a'))
+        cache.set('expired', 1, 0)
+        self.assertIsNone(cache.get('expired'))
+        cache.clear()
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_shared_between_instances(self):
+        other = self.make_cache()
+        self.cache.set('feed-generation:index', 1, None)
+        other.incr('feed-generation:index')
+        self.assertEqual(self.cache.get('feed-generation:index'), 2)
+
+    def test_large_values_are_compressed(self):
+        page = 'карточка поста ' * 1000
+        self.cache.set('page', page)
+        self.assertEqual(self.cache.get('page'), page)
+        self.assertLess(self.cache.stats()['bytes'], len(page.encode()) / 10)
+
+    def test_lru_eviction_by_bytes(self):
+        cache = self.make_cache(MAX_BYTES=3000, COMPRESS_MIN_BYTES=10 ** 6)
+        value = os.urandom(900)
+        for key in ('old', 'read', 'newer'):
+            cache.set(key, value)
+        # Прочитанная запись становится самой свежей
+        cache.get('read')
+        cache.set('newest', value)
+        self.assertEqual(
+            set(cache.get_many(['old', 'read', 'newer', 'newest'])),
+            {'read', 'newer', 'newest'},
+        )
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], 3000)
+
+    def test_stats_count_hits_and_misses(self):
+        self.cache.set('key', 1)
+        self.cache.get_many(['key', 'missing'])
+        self.cache.get('key')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.cache.reset_stats()
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+    def test_reads_do_not_wait_for_writers(self):
+        cache = self.make_cache(FLUSH_INTERVAL=0)
+        cache.set('key', 1)
+        writer = sqlite3.connect(cache.location, isolation_level=None)
+        self.addCleanup(writer.close)
+        writer.execute('BEGIN IMMEDIATE')
+        start = time.monotonic()
+        self.assertEqual(cache.get('key'), 1)
+        # Конец запроса: файл занят - отметки откладываются
+        cache.close()
+        self.assertLess(time.monotonic() - start, 1)
+        writer.execute('COMMIT')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_tests_use_temporary_file(self):
+        self.assertFalse(
+            default_cache.location.startswith(settings.BASE_DIR)
+        )
@@ -0,0 +1,134 @@
+# posts/tests/test_storage.py
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from PIL import Image
+
+from ..models import Post, StoredImage
+from ..storage import image_storage
+from ..thumbnails import ready_thumbnail
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def run_on_commit(func):
+    func()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+@mock.patch('posts.images.transaction.on_commit', run_on_commit)
+class ContentAddressedStorageTests(TestCase):
+    """Тесты хранилища картинок по содержимому"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def photo(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(
+            name='photo.png', content=buffer.getvalue(),
+            content_type='image/png',
+        )
+
+    def create(self, color='red'):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Снимок', 'image': self.photo(color)},
+        )
+        return Post.objects.latest('pk')
+
+    def test_same_picture_is_stored_once(self):
+        first = self.create()
+        second = self.create()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_webp.name, second.image_webp.name)
+        with first.image.open('rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self.assertEqual(first.image.name, f'posts/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.path)],
+        )
+        self.assertEqual(
+            StoredImage.objects.get(name=first.image.name).refs, 2
+        )
+        # Миниатюры у постов тоже общие
+        self.assertEqual(
+            ready_thumbnail(first.image, 'card').name,
+            ready_thumbnail(second.image, 'card').name,
+        )
+
+    def test_last_reference_removes_file_and_thumbnails(self):
+        first = self.create()
+        second = self.create()
+        thumbnail = ready_thumbnail(first.image, 'card')
+        first.delete()
+        self.assertTrue(os.path.exists(second.image.path))
+        self.assertEqual(
+            StoredImage.objects.get(name=second.image.name).refs, 1
+        )
+        second.delete()
+        self.assertFalse(os.path.exists(second.image.path))
+        self.assertFalse(os.path.exists(second.image_webp.path))
+        self.assertFalse(thumbnail.exists())
+        self.assertIsNone(ready_thumbnail(second.image, 'card'))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_replaced_image_is_released(self):
+        post = self.create()
+        old = post.image.path
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Новый снимок', 'image': self.photo('blue')},
+        )
+        post.refresh_from_db()
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertEqual(StoredImage.objects.count(), 2)
+
+    def test_same_picture_uploaded_again_keeps_one_reference(self):
+        post = self.create()
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Тот же снимок', 'image': self.photo()},
+        )
+        post.refresh_from_db()
+        self.assertEqual(
+            list(StoredImage.objects.values_list('refs', flat=True)), [1, 1]
+        )
+        post.delete()
+        self.assertFalse(os.path.exists(post.image.path))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_files_without_references_are_kept(self):
+        name = 'posts/legacy.gif'
+        path = image_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'GIF89a')
+        self.assertFalse(image_storage.release(name))
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,157 @@
+# posts/tests/test_thumbnails.py
+import shutil
+import tempfile
+from unittest import mock
+
+from io import StringIO
+
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from sorl.thumbnail import default
+
+from ..models import Post
+from ..caching import card_key, card_stats, get_cards
+from ..thumbnails import enqueue, generate, ready_thumbnail
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    """Тесты построения миниатюр при загрузке"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, color=b'\xFF\xFF\xFF'):
+        return SimpleUploadedFile(
+            name=name,
+            content=SMALL_GIF.replace(b'\xFF' * 3, color),
+            content_type='image/gif',
+        )
+
+    def test_upload_builds_thumbnails(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с картинкой', 'image': self.upload('small.gif')},
+        )
+        post = Post.objects.get()
+        thumbnail = ready_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        # Отрисовка ленты картинку не декодирует
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            response = self.client.get(reverse('posts:index'))
+        get_image.assert_not_called()
+        self.assertContains(response, thumbnail.url)
+
+    def create(self, name, color=b'\xFF\xFF\xFF'):
+        """Пост, миниатюры которого еще не построены"""
+        with mock.patch('posts.thumbnails.enqueue'):
+            return Post.objects.create(
+                author=self.user,
+                text=f'Пост {name}',
+                image=self.upload(name, color),
+            )
+
+    def test_original_shown_until_thumbnail_is_ready(self):
+        post = self.create('later.gif')
+        self.assertIsNone(ready_thumbnail(post.image, 'card'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Новый текст', 'image': self.upload('edited.gif')},
+        )
+        post.refresh_from_db()
+        thumbnail = ready_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(
+            self.client.get(reverse('posts:index')), thumbnail.url
+        )
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        posts = [self.create(f'page_{index}.gif') for index in range(5)]
+        for post in posts[:3]:
+            enqueue(post)
+        posts = list(Post.objects.select_related('author'))
+        cache.clear()
+        with self.assertNumQueries(1):
+            cards = get_cards(posts)
+        for post in posts:
+            thumbnail = ready_thumbnail(post.image, 'card')
+            with self.subTest(post=post.text):
+                self.assertIn(
+                    (thumbnail or post.image).url, cards[post.pk]
+                )
+        # Карточки отрисовываются заново, миниатюры - из кэша sorl
+        cache.delete_many([card_key(post) for post in posts])
+        with self.assertNumQueries(0):
+            get_cards(posts)
+        self.assertEqual(card_stats()['misses'], 10)
+
+    def test_saved_post_builds_thumbnails(self):
+        # Пост из админки или скрипта, мимо формы
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('admin.gif')
+        )
+        self.assertIsNotNone(ready_thumbnail(post.image, 'card'))
+        with mock.patch('posts.thumbnails.enqueue') as enqueue_mock:
+            post.text = 'Новый текст'
+            post.save()
+        enqueue_mock.assert_not_called()
+
+    def test_missing_file_is_not_enqueued(self):
+        with mock.patch('posts.thumbnails.generate') as generate:
+            Post.objects.create(
+                author=self.user, text='Пост', image='posts/gone.gif'
+            )
+            Post.objects.create(
+                author=self.user, text='Пост', image='/tmp/outside.gif'
+            )
+        generate.assert_not_called()
+
+    def test_build_thumbnails_command(self):
+        # Разное содержимое - разные файлы в хранилище
+        posts = [
+            self.create('old.gif', b'\x00\x00\x00'),
+            self.create('new.gif', b'\x00\x00\xFF'),
+        ]
+        enqueue(posts[1])
+        lost = self.create('lost.gif', b'\x00\xFF\x00')
+        lost.image.storage.delete(lost.image.name)
+        out = StringIO()
+        with mock.patch(
+            'posts.thumbnails.generate', wraps=generate
+        ) as generate_mock:
+            call_command('build_thumbnails', batch_size=1, stdout=out)
+        generate_mock.assert_called_once_with(posts[0].pk, posts[0].image.name)
+        self.assertIn('Построены миниатюры картинок: 1', out.getvalue())
+        self.assertIn('Файлов не найдено: 1', out.getvalue())
+        self.assertIsNotNone(ready_thumbnail(posts[0].image, 'card'))
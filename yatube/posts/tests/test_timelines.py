@@ -0,0 +1,152 @@
+# posts/tests/test_timelines.py
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+
+from ..models import Follow, Post, PulledAuthor, TimelineEntry
+from ..paginators import KeysetPaginator
+from ..timelines import follow_feed, timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    """Тесты материализованной ленты подписок"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline_posts(self.reader)), [self.old_post])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(timeline_posts(self.reader).exists())
+
+    def test_new_post_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            list(timeline_posts(self.reader)),
+            [new_post, self.old_post],
+        )
+        # В ленту автора его собственный пост не попадает
+        self.assertFalse(timeline_posts(self.author).exists())
+
+    def test_same_pub_date_ordered_by_post_id(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {index}')
+            for index in range(2)
+        ]
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            pub_date=self.old_post.pub_date
+        )
+        TimelineEntry.objects.update(pub_date=self.old_post.pub_date)
+        self.assertEqual(
+            list(timeline_posts(self.reader)),
+            [posts[1], posts[0], self.old_post],
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_is_capped(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {index}')
+            for index in range(3)
+        ]
+        # Публикация ленту не обрезает, это делает периодическая команда
+        self.assertEqual(TimelineEntry.objects.count(), 4)
+        out = StringIO()
+        call_command('rebuild_timelines', '--trim', stdout=out)
+        self.assertIn('Лент обрезано: 1', out.getvalue())
+        self.assertEqual(
+            list(timeline_posts(self.reader)),
+            posts[:0:-1],
+        )
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(list(timeline_posts(self.reader)), [self.old_post])
+
+
+@override_settings(TIMELINE_PULL_THRESHOLD=2, TIMELINE_PUSH_THRESHOLD=2)
+class HybridFeedTests(TestCase):
+    """Тесты смешанной ленты: push для обычных авторов, pull для звезд"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+
+    def setUp(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        self.posts = [
+            Post.objects.create(author=author, text=f'Пост {index}')
+            for index, author in enumerate(
+                [self.star, self.author, self.star, self.author]
+            )
+        ]
+
+    def test_star_is_pulled_not_pushed(self):
+        self.assertTrue(PulledAuthor.objects.filter(pk=self.star.pk))
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+        self.assertEqual(list(follow_feed(self.reader)), self.posts[::-1])
+        self.assertEqual(follow_feed(self.reader).count(), 4)
+
+    def test_follow_index_merges_feeds(self):
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), self.posts[::-1]
+        )
+
+    def test_keyset_pages_over_merged_feed(self):
+        paginator = KeysetPaginator(follow_feed(self.reader), 3)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        self.assertEqual(list(first) + list(second), self.posts[::-1])
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_star_demoted_when_followers_leave(self):
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertFalse(PulledAuthor.objects.filter(pk=self.star.pk))
+        self.assertEqual(list(follow_feed(self.reader)), self.posts[::-1])
+        self.assertEqual(
+            TimelineEntry.objects.filter(post__author=self.star).count(), 2
+        )
+
+    @override_settings(TIMELINE_WORKERS=1)
+    def test_mode_changes_after_commit(self):
+        # Переход в push не выполняется в запросе на отписку
+        with mock.patch('posts.timelines.transaction.on_commit') as on_commit:
+            Follow.objects.filter(user=self.fan).delete()
+        on_commit.assert_called_once()
+        self.assertTrue(PulledAuthor.objects.filter(pk=self.star.pk))
+        # Пока автор в pull, лента подписчика все равно полная
+        self.assertEqual(list(follow_feed(self.reader)), self.posts[::-1])
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=3)
+    def test_no_mode_change_below_threshold(self):
+        with mock.patch('posts.timelines.update_mode') as update_mode:
+            Follow.objects.create(user=self.fan, author=self.author)
+        update_mode.assert_not_called()
@@ -0,0 +1,222 @@
+"""Миниатюры картинок постов.
+
+Миниатюры всех размеров из POST_THUMBNAILS строятся в пуле процессов
+(THUMBNAIL_WORKERS), как только пост сохранен с новой картинкой - из
+формы, админки или скрипта (posts/signals.py). Шаблоны только ищут
+готовую миниатюру в хранилище ключей sorl и никогда не декодируют
+картинку, пока отвечают на запрос. Пока миниатюры нет, шаблон
+показывает исходную картинку. Картинкам, загруженным раньше,
+недостающие миниатюры строит команда build_thumbnails.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: рабочим процессам не достаются
+        # соединения с базой родителя
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _pool
+
+
+def thumbnail_options(source, options):
+    """Параметры миниатюры с умолчаниями, как их дополняет sorl"""
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', default.backend._get_format(source))
+    for key, value in default.backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in default.backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(image, size):
+    """Файл миниатюры размера size из POST_THUMBNAILS, без чтения
+    картинки"""
+    source = ImageFile(image)
+    geometry, options = settings.POST_THUMBNAILS[size]
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(image, size):
+    """Готовая миниатюра или None, если ее еще не построили"""
+    if not image:
+        return None
+    return ready_thumbnails([image], size)[image.name]
+
+
+def ready_thumbnails(images, size):
+    """Готовые миниатюры картинок страницы: {имя картинки: миниатюра
+    или None}"""
+    return ready_thumbnail_sizes(images, [size])[size]
+
+
+def ready_thumbnail_sizes(images, sizes):
+    """Готовые миниатюры картинок страницы нескольких размеров:
+    {размер: {имя картинки: миниатюра или None}}.
+
+    Записи хранилища ключей sorl читаются одним get_many из кэша
+    THUMBNAIL_CACHE, а те, которых в кэше нет, - одним запросом
+    к базе, после чего кладутся в кэш на THUMBNAIL_CACHE_TIMEOUT.
+    """
+    images = [image for image in images if image]
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        return {
+            size: {
+                image.name: default.kvstore.get(thumbnail_file(image, size))
+                for image in images
+            }
+            for size in sizes
+        }
+    keys = {
+        add_prefix(thumbnail_file(image, size).key): (size, image.name)
+        for size in sizes
+        for image in images
+    }
+    kv_cache = caches[thumbnail_settings.THUMBNAIL_CACHE]
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        # Отсутствие запоминаем так же, как sorl: миниатюру,
+        # построенную позже, sorl положит в кэш сам
+        kv_cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        values.update(found)
+    thumbnails = {size: {} for size in sizes}
+    for key, (size, name) in keys.items():
+        value = values.get(key, EMPTY_VALUE)
+        thumbnails[size][name] = (
+            deserialize_image_file(value) if value is not EMPTY_VALUE
+            else None
+        )
+    return thumbnails
+
+
+def generate(post_id, image_name):
+    """Строим все миниатюры картинки поста (в рабочем процессе)"""
+    from .models import Post
+
+    # Ключи sorl зависят от хранилища исходника
+    source = ImageFile(image_name, Post._meta.get_field('image').storage)
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        default.backend.get_thumbnail(source, geometry, **options)
+    post = Post.objects.filter(pk=post_id, image=image_name).first()
+    if post is not None:
+        # Новая версия поста сбрасывает закэшированные карточки
+        # и ленты, отрисованные еще с исходной картинкой
+        post.save(update_fields=['updated'])
+
+
+def source_exists(image):
+    """Есть ли файл картинки в хранилище; имя вне хранилища, например
+    абсолютный путь, считается отсутствующим"""
+    try:
+        return image.storage.exists(image.name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def enqueue(post):
+    """Ставим построение миниатюр картинки поста в очередь; картинку
+    без файла пропускаем"""
+    if not post.image or not source_exists(post.image):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post.pk, post.image.name)
+        return
+    transaction.on_commit(
+        lambda: pool().submit(generate, post.pk, post.image.name)
+        .add_done_callback(log_failure)
+    )
+
+
+def build_missing(batch_size=1000):
+    """Строим недостающие миниатюры картинкам, загруженным раньше.
+
+    Посты читаются пачками, готовые миниатюры пачки ищутся одним
+    запросом. Вернет (построено картинок, файлов не найдено).
+    """
+    from .counters import batches
+    from .models import Post
+
+    sizes = list(settings.POST_THUMBNAILS)
+    built = missing = 0
+    for pks in batches(Post.objects.exclude(image=''), batch_size):
+        posts = [
+            Post(pk=pk, image=name)
+            for pk, name in Post.objects.filter(
+                pk__in=pks
+            ).values_list('pk', 'image')
+        ]
+        ready = ready_thumbnail_sizes([post.image for post in posts], sizes)
+        jobs = []
+        for post in posts:
+            if all(ready[size][post.image.name] for size in sizes):
+                continue
+            if not source_exists(post.image):
+                missing += 1
+                continue
+            jobs.append((post.pk, post.image.name))
+        if not settings.THUMBNAIL_WORKERS:
+            for job in jobs:
+                generate(*job)
+            built += len(jobs)
+            continue
+        futures = [pool().submit(generate, *job) for job in jobs]
+        for future in futures:
+            log_failure(future)
+            built += future.exception() is None
+    return built, missing
+
+
+def forget(image_name):
+    """Удаляем миниатюры картинки, которой больше нет, и их записи"""
+    from .models import Post
+
+    default.kvstore.delete(
+        ImageFile(image_name, Post._meta.get_field('image').storage)
+    )
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось построить миниатюры', exc_info=future.exception()
+        )
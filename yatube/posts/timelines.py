@@ -0,0 +1,313 @@
+"""Материализованные ленты подписок.
+
+Обычный автор раскладывает новый пост по лентам подписчиков при
+публикации (push), поэтому страница избранных авторов читает одну
+ленту по индексу (user, -pub_date) вместо соединения Post с Follow.
+Посты авторов, у которых подписчиков больше TIMELINE_PULL_THRESHOLD,
+не раскладываются: они подтягиваются при чтении (pull) и сливаются
+с лентой пользователя.
+
+Ленты обновляют сигналы Post и Follow. Посты, созданные мимо
+сигналов (bulk_create, загрузка данных), попадут в ленты только
+после rebuild_timelines. Публикация ленты не обрезает: до
+TIMELINE_MAX_LENGTH записей их укорачивает периодический запуск
+rebuild_timelines --trim.
+
+Режим автора меняется, когда счетчик подписчиков переходит порог:
+TIMELINE_PULL_THRESHOLD на пути в pull, TIMELINE_PUSH_THRESHOLD на
+пути обратно. Сам переход удаляет или раскладывает записи во всех
+лентах подписчиков, поэтому выполняется после фиксации транзакции
+в пуле TIMELINE_WORKERS процессов, а не в запросе на подписку.
+"""
+import heapq
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, PulledAuthor, TimelineEntry, UserCounters
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        # Один процесс по умолчанию: переходы одного автора не
+        # обгоняют друг друга
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.TIMELINE_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _pool
+
+
+class MergedFeed:
+    """Слияние нескольких лент, отсортированных по (pub_date, id).
+
+    Ведет себя как QuerySet ровно настолько, насколько это нужно
+    пагинаторам: срезы, count(), filter() и order_by().
+    """
+
+    def __init__(self, *querysets, reverse=True):
+        self.querysets = querysets
+        self.reverse = reverse
+
+    def _clone(self, method, *args, **kwargs):
+        return MergedFeed(
+            *(getattr(qs, method)(*args, **kwargs) for qs in self.querysets),
+            reverse=self.reverse,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._clone('filter', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._clone('select_related', *fields)
+
+    def prefetch_related(self, *lookups):
+        return self._clone('prefetch_related', *lookups)
+
+    def order_by(self, *fields):
+        feed = self._clone('order_by', *fields)
+        feed.reverse = fields[0].startswith('-')
+        return feed
+
+    def count(self):
+        # Ленты не пересекаются: посты pull-авторов не раскладываются
+        return sum(qs.count() for qs in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            posts = self[index:index + 1]
+            if not posts:
+                raise IndexError(index)
+            return posts[0]
+        start, stop = index.start or 0, index.stop
+        # Из каждой ленты достаточно первых stop постов
+        sources = (
+            qs if stop is None else qs[:stop] for qs in self.querysets
+        )
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=self.reverse,
+        )
+        return list(islice(merged, start, stop))
+
+
+def timeline_posts(user):
+    """Посты, разложенные в ленту пользователя"""
+    return Post.objects.filter(
+        timeline_entries__user=user
+    ).order_by(
+        # post_id, а не post: иначе сортировка уходит в Post.Meta.ordering
+        F('timeline_entries__pub_date').desc(),
+        F('timeline_entries__post_id').desc(),
+    )
+
+
+def follow_feed(user):
+    """Лента подписок: разложенные посты плюс посты pull-авторов"""
+    pushed = timeline_posts(user)
+    pulled_ids = list(
+        Follow.objects.filter(
+            user=user, author__pulled_feed__isnull=False
+        ).values_list('author_id', flat=True)
+    )
+    if not pulled_ids:
+        return pushed
+    pulled = Post.objects.filter(
+        author_id__in=pulled_ids
+    ).order_by('-pub_date', '-pk')
+    return MergedFeed(pushed, pulled)
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(pk=author_id).exists()
+
+
+def trim(user_ids=None):
+    """Оставляем в лентах не больше TIMELINE_MAX_LENGTH записей.
+
+    По умолчанию - во всех лентах, которые стали длиннее. Лишние
+    записи удаляются диапазоном по индексу (user, -pub_date, -post)
+    от первой лишней; вернет число обрезанных лент.
+    """
+    max_length = settings.TIMELINE_MAX_LENGTH
+    if user_ids is None:
+        user_ids = TimelineEntry.objects.order_by().values(
+            'user_id'
+        ).annotate(entries=Count('pk')).filter(
+            entries__gt=max_length
+        ).values_list('user_id', flat=True)
+    trimmed = 0
+    for user_id in list(user_ids):
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        extra = list(entries.values_list(
+            'pub_date', 'post_id'
+        )[max_length:max_length + 1])
+        if not extra:
+            continue
+        (pub_date, post_id), = extra
+        entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lte=post_id)
+        ).delete()
+        trimmed += 1
+    return trimmed
+
+
+def push(post):
+    """Кладем новый пост в ленты всех подписчиков автора"""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Дописываем в ленту последние посты нового автора"""
+    if is_pulled(author_id):
+        return
+    fan_out(author_id, [user_id])
+
+
+def fan_out(author_id, user_ids):
+    """Раскладываем последние посты автора по лентам user_ids"""
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.TIMELINE_MAX_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id in user_ids
+            for pk, pub_date in posts
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убираем из ленты посты автора, от которого отписались"""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def check_mode(author_id):
+    """Ставим в очередь смену режима автора, если счетчик
+    подписчиков перешел порог"""
+    followers = UserCounters.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is None:
+        return
+    if is_pulled(author_id):
+        due = followers < settings.TIMELINE_PUSH_THRESHOLD
+    else:
+        due = followers >= settings.TIMELINE_PULL_THRESHOLD
+    if not due:
+        return
+    if not settings.TIMELINE_WORKERS:
+        update_mode(author_id)
+        return
+    transaction.on_commit(
+        lambda: pool().submit(update_mode, author_id)
+        .add_done_callback(log_failure)
+    )
+
+
+def update_mode(author_id):
+    """Переводим автора в pull или обратно в push по настоящему
+    числу подписчиков"""
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if is_pulled(author_id):
+        if followers < settings.TIMELINE_PUSH_THRESHOLD:
+            demote(author_id)
+    elif followers >= settings.TIMELINE_PULL_THRESHOLD:
+        promote(author_id)
+
+
+def promote(author_id):
+    """Автор уходит в pull: его записи удаляются из всех лент"""
+    # Читатели видят автора либо в pull, либо в полных лентах
+    with transaction.atomic():
+        PulledAuthor.objects.get_or_create(author_id=author_id)
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+
+
+def demote(author_id):
+    """Автор возвращается в push: его посты раскладываются по лентам
+    подписчиков"""
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    with transaction.atomic():
+        PulledAuthor.objects.filter(pk=author_id).delete()
+        user_ids = list(
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+        )
+        for start in range(0, len(user_ids), batch_size):
+            fan_out(author_id, user_ids[start:start + batch_size])
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось сменить режим ленты', exc_info=future.exception()
+        )
+
+
+def refresh_modes():
+    """Заново определяем pull-авторов по текущему числу подписчиков"""
+    PulledAuthor.objects.all().delete()
+    PulledAuthor.objects.bulk_create(
+        PulledAuthor(author_id=author_id)
+        for author_id in Follow.objects.values('author_id').annotate(
+            followers=Count('pk')
+        ).filter(
+            followers__gte=settings.TIMELINE_PULL_THRESHOLD
+        ).values_list('author_id', flat=True)
+    )
+
+
+def rebuild(user_ids=None):
+    """Пересобираем ленты с нуля; по умолчанию - все"""
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is None:
+        refresh_modes()
+    else:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    for user_id, author_id in list(
+        follows.values_list('user_id', 'author_id')
+    ):
+        backfill(user_id, author_id)
+    trim(user_ids)
@@ -1,48 +1,75 @@
 # posts/views.py
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
-from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
 from django.conf import settings
 
-from .models import Post, Group, Follow
+from core.query_budget import query_budget
+
+from .models import Follow, Group, Post, UserCounters
+from .caching import cache_data, cache_feed, feed_etag
 from .forms import PostForm, CommentForm
+from .counters import forget_total_posts, schedule_recount, total_posts
+from .object_cache import groups, users
+from .search import search
+from .paginators import CountingPaginator, KeysetPaginator
+from .timelines import follow_feed
 
 
-def paginated_context(request, post_list):
+def paginated_context(request, post_list, count=None, on_drift=None):
+    # Ленты из KEYSET_PAGINATION_FEEDS листаются по курсору
+    if request.resolver_match.url_name in settings.KEYSET_PAGINATION_FEEDS:
+        paginator = KeysetPaginator(post_list, settings.POSTS_ON_PAGE)
+        return paginator.get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
     # Из URL извлекаем номер запрошенной страницы
     page_number = request.GET.get('page')
-    # Показывать POSTS_ON_PAGE записей на странице.
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
+    # Показывать POSTS_ON_PAGE записей на странице. Если общее число
+    # постов известно из счетчиков, COUNT(*) не нужен; разошедшийся
+    # с базой счетчик пересчитает on_drift
+    if callable(count):
+        count = count()
+    paginator = CountingPaginator(
+        post_list, settings.POSTS_ON_PAGE, count=count, on_drift=on_drift
+    )
     return paginator.get_page(page_number)
 
 
-@cache_page(settings.CACHE_INDEX_PAGE)
+@condition(etag_func=feed_etag('index'))
+@cache_feed('index')
+@query_budget(4)
 def index(request):
     """Главная страница"""
-    post_list = Post.objects.select_related('group')
-    page_obj = paginated_context(request, post_list)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginated_context(
+        request, post_list, total_posts, forget_total_posts
+    )
     return render(request, 'posts/index.html', {'page_obj': page_obj})
 
 
 @login_required
+@query_budget(5)
 def follow_index(request):
     """Страница избранных авторов"""
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('group')
+    post_list = follow_feed(request.user).select_related(
+        'author', 'group'
+    )
     page_obj = paginated_context(request, post_list)
     return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
 @login_required
+@query_budget(15)
 def profile_follow(request, username):
     """Создаем подписку на автора"""
-    author = get_object_or_404(User, username=username)
+    author = users.get_or_404(username)
     if request.user.username != author.username:
+        # Уникальность (user, author) держит база: при гонке двух
+        # кликов get_or_create поймает IntegrityError и вернет подписку
         Follow.objects.get_or_create(
             user=request.user,
             author=author,
@@ -51,18 +78,25 @@ def profile_follow(request, username):
 
 
 @login_required
+@query_budget(12)
 def profile_unfollow(request, username):
     """Удаляем подписку на автора"""
-    author = get_object_or_404(User, username=username)
+    author = users.get_or_404(username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', request.user.username)
 
 
+@condition(etag_func=feed_etag('group:{slug}'))
+@cache_feed('group:{slug}')
+@query_budget(5)
 def group_posts(request, slug):
     """Страница группы"""
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginated_context(request, post_list)
+    group = groups.get_or_404(slug)
+    post_list = group.posts.select_related('author')
+    page_obj = paginated_context(
+        request, post_list, group.posts_count,
+        lambda: schedule_recount(Group, group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -70,36 +104,132 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+def profile_feed(username):
+    """Лента профиля по id автора: сигналам постов и подписок
+    не нужно загружать автора ради его имени"""
+    author = users.get(username)
+    return f'profile:{author.pk}' if author else 'profile:'
+
+
+@condition(etag_func=feed_etag(profile_feed))
+@cache_feed(profile_feed)
+@query_budget(5)
 def profile(request, username):
     """Страница автора"""
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginated_context(request, post_list)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author
-    ).exists()
+    author = users.get_or_404(username)
+    post_list = author.posts.select_related('author', 'group')
+    try:
+        posts_count = author.counters.posts_count
+    except UserCounters.DoesNotExist:
+        # Пользователь заведен мимо сигналов, до reconcile_counters
+        # число постов считаем по базе
+        posts_count = None
+    page_obj = paginated_context(
+        request, post_list, posts_count,
+        lambda: schedule_recount(UserCounters, author.pk),
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+def search_posts(request):
+    """Поиск по постам, при желании - в группе или у автора"""
+    query = request.GET.get('q', '')
+    group_slug = request.GET.get('group')
+    username = request.GET.get('author')
+    group = groups.get(group_slug) if group_slug else None
+    author = users.get(username) if username else None
+    if (group_slug and group is None) or (username and author is None):
+        # Искать негде
+        query = ''
+    page_obj = search(
+        query,
+        settings.POSTS_ON_PAGE,
+        group=group,
+        author=author,
+        after=request.GET.get('after'),
+    )
+    params = request.GET.copy()
+    params.pop('after', None)
+    first_query = params.urlencode()
+    params['after'] = page_obj.next_cursor or ''
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'page_obj': page_obj,
+        'first_query': first_query,
+        'next_query': params.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@condition(etag_func=feed_etag(
+    'post:{post_id}', settings.CACHE_POST_DETAIL
+))
+@query_budget(5)
 def post_detail(request, post_id):
     """Страница одного поста"""
+    # Пост с автором, группой и первой страницей комментариев
+    # собираются в кэше целиком; сигналы поста и комментариев
+    # сбрасывают их через ленту post:<id>
+    context = cache_data(
+        f'post:{post_id}',
+        f'post-detail:{post_id}',
+        lambda: post_detail_data(post_id),
+        settings.CACHE_POST_DETAIL,
+    )
+    context['form'] = CommentForm()
+    return render(request, 'posts/post_detail.html', context)
+
+
+def with_public_author(queryset):
+    """Автор только с полями, которые хранит кэш пользователей:
+    объекты уходят в кэш, пароль и почта им не нужны"""
+    return queryset.select_related('author').only(
+        *(field.name for field in queryset.model._meta.concrete_fields),
+        *(f'author__{field}' for field in users.fields),
+    )
+
+
+def post_detail_data(post_id):
+    post = get_object_or_404(
+        with_public_author(Post.objects.select_related(
+            'author__counters', 'group'
+        )),
+        pk=post_id,
+    )
+    # Сразу отдаем только первую страницу комментариев,
+    # остальные подгружает post_comments
+    comments = KeysetPaginator(
+        with_public_author(post.comments.all()), settings.COMMENTS_ON_PAGE
+    ).get_page()
+    return {
+        'post': post,
+        'comments': comments,
+    }
+
+
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующая страница комментариев к посту фрагментом HTML"""
     post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
-    form = CommentForm()
+    comments = KeysetPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_ON_PAGE
+    ).get_page(after=request.GET.get('after'))
     context = {
         'post': post,
         'comments': comments,
-        'form': form,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'includes/comments.html', context)
 
 
 @login_required
+@query_budget(10)
 def post_create(request):
     """Создаем пост"""
     form = PostForm(
@@ -119,10 +249,11 @@ def post_create(request):
 
 
 @login_required
+@query_budget(8)
 def post_edit(request, post_id):
     """Редактируем пост"""
     post = get_object_or_404(Post, pk=post_id)
-    if not post.author == request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -141,6 +272,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@query_budget(5)
 def add_comment(request, post_id):
     """Добавляем комментарий"""
     post = get_object_or_404(Post, pk=post_id)
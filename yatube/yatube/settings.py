@@ -49,6 +49,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Тестовое окружение: свой файл кэша на запуск (см. core.testing)
+TEST_RUNNER = 'core.testing.TestRunner'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
@@ -123,6 +126,8 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 POSTS_ON_PAGE = 10
+# Комментарии под постом отдаются страницами по курсору
+COMMENTS_ON_PAGE = 20
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
@@ -130,9 +135,96 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEBUG = True
 
+# Кэш в файле SQLite общий для всех процессов на хосте; записи
+# вытесняются по объему (MAX_BYTES), крупные значения сжимаются
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.shared_cache.SharedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+            'COMPRESS_MIN_BYTES': 1024,
+        },
     }
 }
-CACHE_INDEX_PAGE = 20
+# Страницы лент живут в кэше долго: их сбрасывают сигналы моделей
+CACHE_FEED_PAGE = 60 * 60 * 6
+# Пока один запрос перестраивает устаревшую страницу (не дольше
+# CACHE_FEED_LOCK секунд), остальные получают старую копию; копия
+# хранится на CACHE_FEED_GRACE секунд дольше срока страницы
+CACHE_FEED_LOCK = 10
+CACHE_FEED_GRACE = 60
+# Насколько заранее перестраивать страницу перед истечением срока:
+# 0 - не заранее, больше 1 - раньше обычного
+CACHE_FEED_EARLY_BETA = 1
+
+# Ленты (имена URL из posts.urls), которые листаются по курсору
+# ?after=/?before= вместо номеров страниц: 'index', 'group_list',
+# 'profile', 'follow_index'
+KEYSET_PAGINATION_FEEDS = []
+
+# Лента подписок: сколько последних постов хранить у каждого
+# пользователя (лишнее удаляет периодический запуск
+# rebuild_timelines --trim) и какими пачками писать записи в базу
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_BATCH_SIZE = 500
+
+# Авторы, у которых подписчиков не меньше TIMELINE_PULL_THRESHOLD,
+# не раскладываются по лентам, а подтягиваются при чтении. Обратно
+# на раскладку при публикации автор переходит, когда подписчиков
+# становится меньше TIMELINE_PUSH_THRESHOLD. Переходы выполняются
+# после подписки или отписки в TIMELINE_WORKERS процессах (0 - прямо
+# в запросе)
+TIMELINE_PULL_THRESHOLD = 10000
+TIMELINE_PUSH_THRESHOLD = 8000
+TIMELINE_WORKERS = 1
+
+# Отрисованные карточки постов; ключ карточки меняется вместе с постом
+CACHE_POST_CARD = 60 * 60 * 24
+
+# Собранная страница поста (пост, автор, первые комментарии); ее
+# сбрасывают правка поста и новые комментарии, срок ограничивает
+# отставание имени и счетчиков автора
+CACHE_POST_DETAIL = 60 * 10
+
+# Превышение бюджета запросов (@query_budget) роняет запрос
+QUERY_BUDGET_STRICT = False
+
+# Группы по slug и авторы по username: сколько хранить в общем кэше,
+# в памяти процесса и сколько помнить, что такого объекта нет
+OBJECT_CACHE_TIMEOUT = 60 * 60
+OBJECT_CACHE_LOCAL_TTL = 5
+OBJECT_CACHE_MISSING_TIMEOUT = 60
+
+# Миниатюры картинок постов: имя размера -> (геометрия, параметры
+# sorl). Все они строятся сразу после загрузки в THUMBNAIL_WORKERS
+# процессах (0 - прямо в запросе)
+POST_THUMBNAILS = {
+    'card_small': ('480x170', {'crop': 'center', 'upscale': True}),
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки: больше POST_IMAGE_MAX_PIXELS пикселей не
+# принимаем, большую сторону уменьшаем до POST_IMAGE_MAX_SIDE и
+# перекодируем в JPEG и WebP с таким качеством
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_JPEG_QUALITY = 85
+POST_IMAGE_WEBP_QUALITY = 80
+
+# Загрузки пишутся во временный файл, а не держатся в памяти
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Размеры миниатюр для srcset картинки поста, от меньшей к большей;
+# src - последняя из них
+POST_IMAGE_SRCSET = ['card_small', 'card']
+
+# Общее число постов для пагинатора главной; между пересчетами
+# его сдвигают сигналы создания и удаления постов
+CACHE_POSTS_TOTAL = 60 * 60
+# Счетчик, с которым разошелся пагинатор, пересчитывается не чаще
+# раза в столько секунд
+COUNTERS_RECOUNT_THROTTLE = 60